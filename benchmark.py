@@ -0,0 +1,311 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import monitor
+
+# ==========================================
+#     离线基准测试：本地模拟各平台接口与 Bark
+# ==========================================
+# 用法：python benchmark.py --sizes 10,100,1000 --latency 20 --error-rate 0.01
+# 模拟服务器运行在独立子进程中，峰值内存 (RSS) 只统计 monitor 所在进程
+
+PLATFORM_SHARES = [("App Store", 0.35), ("Google Play", 0.15), ("TapTap", 0.15), ("GitHub", 0.15), ("RSS", 0.2)]
+GROUP_COUNT = 4
+
+GRAPHQL_REPO_PATTERN = re.compile(r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\)')
+
+def fake_version(seed):
+    # 同一 seed 在同一轮次中返回固定版本号，--round 变化时版本号随之变化
+    return f"1.{seed % 7}.{seed % 3}"
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = {}
+    stats = {}
+    stats_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def count(self, route):
+        with self.stats_lock:
+            self.stats[route] = self.stats.get(route, 0) + 1
+
+    def reply(self, status, body, content_type="application/json"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate(self, route):
+        self.count(route)
+        latency = self.options["latency"]
+        if latency:
+            time.sleep(latency)
+        if random.random() < self.options["error_rate"]:
+            self.reply(503, '{"error": "simulated"}')
+            return False
+        return True
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip("/").split("/")
+        if parsed.path == "/__stats":
+            with self.stats_lock:
+                self.reply(200, json.dumps(self.stats))
+            return
+        if parts[-1] == "lookup" and len(parts) <= 2:
+            if not self.simulate("itunes"):
+                return
+            ids = parse_qs(parsed.query).get("id", [""])[0].split(",")
+            results = [{"trackId": int(app_id), "version": fake_version(int(app_id) + self.options["round"])} for app_id in ids if app_id]
+            self.reply(200, json.dumps({"resultCount": len(results), "results": results}))
+        elif parsed.path == "/store/apps/details":
+            if not self.simulate("googleplay"):
+                return
+            seed = int(parse_qs(parsed.query)["id"][0].rsplit("app", 1)[-1])
+            details = [None] * 141
+            details[140] = [[[fake_version(seed + self.options["round"])]]]
+            padding = "x" * (self.options["payload_kb"] * 1024)
+            page = (f"<html><body>{padding}<script class=\"ds:5\">AF_initDataCallback({{key: 'ds:5', hash: '1', "
+                    f"data:{json.dumps([None, [None, None, details]])}, sideChannel: {{}}}});</script>{padding}</body></html>")
+            self.reply(200, page, "text/html")
+        elif len(parts) == 2 and parts[0] == "app":
+            if not self.simulate("taptap"):
+                return
+            padding = "x" * (self.options["payload_kb"] * 1024)
+            version = fake_version(int(parts[1]) + self.options["round"])
+            page = f'<html><body>{padding}<script type="application/ld+json">{{"softwareVersion": "{version}"}}</script></body></html>'
+            self.reply(200, page, "text/html")
+        elif len(parts) == 5 and parts[0] == "repos" and parts[3] == "releases":
+            if not self.simulate("github_rest"):
+                return
+            seed = int(parts[2].rsplit("-", 1)[-1])
+            self.reply(200, json.dumps({"tag_name": "v" + fake_version(seed + self.options["round"])}))
+        elif len(parts) == 2 and parts[0] == "rss":
+            if not self.simulate("rss"):
+                return
+            seed = int(parts[1])
+            entries = max(1, self.options["payload_kb"])
+            items = []
+            for i in range(entries):
+                episode = entries - i + self.options["round"] + seed % 2
+                items.append(f"<item><guid>rss-{seed}-{episode}</guid><title>[Bench] Show {seed} - {episode:02d} [1080P]</title></item>")
+            body = f'<?xml version="1.0"?><rss version="2.0"><channel><title>bench</title>{"".join(items)}</channel></rss>'
+            self.reply(200, body, "application/rss+xml")
+        else:
+            self.count("not_found")
+            self.reply(404, "{}")
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if parsed.path == "/graphql":
+            if not self.simulate("github_graphql"):
+                return
+            query = json.loads(body)["query"]
+            data = {}
+            for alias, owner, name in GRAPHQL_REPO_PATTERN.findall(query):
+                seed = int(name.rsplit("-", 1)[-1])
+                data[alias] = {"latestRelease": {"tagName": "v" + fake_version(seed + self.options["round"])}, "refs": {"nodes": []}}
+            self.reply(200, json.dumps({"data": data}))
+        elif parsed.path.startswith("/bark/"):
+            if not self.simulate("bark"):
+                return
+            self.reply(200, json.dumps({"code": 200, "message": "success"}))
+        elif parsed.path == "/webhook":
+            if not self.simulate("webhook"):
+                return
+            self.reply(204, b"")
+        else:
+            self.count("not_found")
+            self.reply(404, "{}")
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 流式抓取找到目标后会主动断开连接，忽略由此产生的连接重置
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+def serve_fake_upstream(options, port_queue):
+    FakeUpstreamHandler.options = options
+    server = FakeUpstreamServer(("127.0.0.1", 0), FakeUpstreamHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+def start_fake_upstream(options):
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_fake_upstream, args=(options, port_queue), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+def fetch_stats(base_url):
+    session = monitor.get_retry_session(retries=0)
+    return session.get(f"{base_url}/__stats", timeout=5).json()
+
+def build_watch_lists(size, base_url):
+    lists = {platform: [] for platform, _ in PLATFORM_SHARES}
+    for i in range(size):
+        roll = (i * 0.618) % 1.0
+        cumulative = 0.0
+        for platform, share in PLATFORM_SHARES:
+            cumulative += share
+            if roll < cumulative:
+                break
+        name = f"Bench {platform} {i}"
+        if platform == "App Store":
+            lists[platform].append((name, str(100000 + i), ["us", "jp", "hk"][i % 3]))
+        elif platform == "Google Play":
+            lists[platform].append((name, f"bench.app{i}", ["us", "jp", "tw"][i % 3]))
+        elif platform == "TapTap":
+            lists[platform].append((name, str(200000 + i)))
+        elif platform == "GitHub":
+            lists[platform].append((name, f"bench/repo-{i}"))
+        else:
+            lists[platform].append((name, f"{base_url}/rss/{i}"))
+    return lists
+
+def configure_monitor(lists, base_url, workdir, github_graphql, bark_devices=1, webhook=False, consensus=False):
+    monitor.APP_STORE_LIST = lists["App Store"]
+    monitor.GOOGLE_PLAY_LIST = lists["Google Play"]
+    monitor.TAPTAP_LIST = lists["TapTap"]
+    monitor.GITHUB_REPO_LIST = lists["GitHub"]
+    monitor.RSS_LIST = lists["RSS"]
+    names = [item[0] for data_list in lists.values() for item in data_list]
+    monitor.NOTIFICATION_GROUPS = {f"Bench Group {g}": names[g::GROUP_COUNT] for g in range(GROUP_COUNT)}
+    monitor.BUILD_NUMBER_CHECK_APPS = {}
+    monitor.BUILD_NUMBER_CHECK_GROUPS = {}
+    monitor.SUFFIX_CONFIG_APPS = {}
+    monitor.SUFFIX_CONFIG_GROUPS = {}
+    monitor.RSS_REGEX_RULES = {}
+    monitor.RICH_MEDIA_CONFIG = {}
+    monitor.POLL_RELEASE_DAYS = {}
+    monitor.APPSTORE_API_BASE = base_url
+    monitor.APPSTORE_CONSENSUS_APPS = ["*"] if consensus else []
+    monitor.GOOGLE_PLAY_BASE = base_url
+    monitor.GOOGLE_PLAY_SCRAPER_FALLBACK = False
+    monitor.TAPTAP_BASE = base_url
+    monitor.GITHUB_API_BASE = base_url
+    monitor.BARK_SERVER = f"{base_url}/bark"
+    monitor.BARK_KEY = "bench"
+    monitor.BARK_KEYS = [f"bench{device}" for device in range(bark_devices)]
+    monitor.WEBHOOK_SINKS = [{"url": f"{base_url}/webhook", "format": "json"}] if webhook else []
+    monitor.GITHUB_TOKEN = "bench" if github_graphql else None
+    monitor.FORCE_FULL_CHECK = True
+    monitor.HISTORY_FILE = os.path.join(workdir, "version_history.json")
+    monitor.HISTORY_DB_FILE = os.path.join(workdir, "version_history.db")
+    monitor.HTTP_CACHE_FILE = os.path.join(workdir, "http_cache.json")
+    monitor.SCHEDULE_FILE = os.path.join(workdir, "poll_schedule.json")
+    monitor.GITHUB_RATE_LIMIT = monitor.RateLimitTracker()
+    monitor.set_shared_session(None)
+
+def run_pipeline(size, options, github_graphql, verbose, bark_devices=1, webhook=False, consensus=False):
+    server_process, base_url = start_fake_upstream(options)
+    phases = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            lists = build_watch_lists(size, base_url)
+            configure_monitor(lists, base_url, workdir, github_graphql, bark_devices, webhook, consensus)
+            output = sys.stdout if verbose else io.StringIO()
+            with contextlib.redirect_stdout(output):
+                monitor.METRICS.reset()
+                started = time.perf_counter()
+                phase_started = started
+                monitor.compile_app_config()
+                monitor.HTTP_CACHE.load(monitor.HTTP_CACHE_FILE)
+                monitor.POLL_SCHEDULE.load(monitor.SCHEDULE_FILE)
+                store = monitor.open_history_store()
+                history = monitor.load_history(store)
+                phases["setup"] = time.perf_counter() - phase_started
+
+                phase_started = time.perf_counter()
+                new_history, current_state, update_buffer = monitor.run_checks(history)
+                phases["check"] = time.perf_counter() - phase_started
+
+                phase_started = time.perf_counter()
+                if update_buffer:
+                    monitor.enqueue_notifications(store.outbox(), monitor.render_group_messages(update_buffer, current_state))
+                store.upsert_many(monitor.diff_history(history, new_history))
+                monitor.POLL_SCHEDULE.update(monitor.schedule_changes(history, new_history))
+                monitor.POLL_SCHEDULE.save()
+                monitor.HTTP_CACHE.save()
+                phases["persist"] = time.perf_counter() - phase_started
+
+                phase_started = time.perf_counter()
+                monitor.drain_outbox(store.outbox())
+                store.close()
+                phases["notify"] = time.perf_counter() - phase_started
+                wall_time = time.perf_counter() - started
+            stats = fetch_stats(base_url)
+            run_report = monitor.METRICS.report()
+    finally:
+        server_process.terminate()
+        server_process.join()
+    total_requests = sum(count for route, count in stats.items())
+    return {
+        "targets": size,
+        "wall_time": round(wall_time, 3),
+        "requests": total_requests,
+        "requests_per_sec": round(total_requests / wall_time, 1) if wall_time else None,
+        "updates": len(update_buffer),
+        "history_keys": len(new_history),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "phases": {phase: round(seconds, 3) for phase, seconds in phases.items()},
+        "requests_by_route": stats,
+        "outcomes": run_report["outcomes"],
+        "hosts": run_report["hosts"]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="monitor.py 离线基准测试")
+    parser.add_argument("--sizes", default="10,100,1000", help="监控目标数量，逗号分隔 (例如 10,100,1000,10000)")
+    parser.add_argument("--latency", type=float, default=20, help="模拟接口延迟 (毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟接口返回 503 的概率 (0-1)")
+    parser.add_argument("--payload-kb", type=int, default=64, help="TapTap 页面填充大小 (KB)，同时决定 RSS 条目数")
+    parser.add_argument("--round", type=int, default=1, help="模拟版本轮次，改变该值可让部分目标出现新版本")
+    parser.add_argument("--github-rest", action="store_true", help="GitHub 使用 REST 逐个查询 (默认模拟 GraphQL 批量查询)")
+    parser.add_argument("--bark-devices", type=int, default=1, help="模拟的 Bark 设备数量")
+    parser.add_argument("--webhook", action="store_true", help="额外模拟一个 Webhook 推送目标")
+    parser.add_argument("--consensus", action="store_true", help="对全部 App Store 目标启用多路采样")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="显示 monitor 的运行日志")
+    args = parser.parse_args(argv)
+
+    options = {
+        "latency": args.latency / 1000.0,
+        "error_rate": args.error_rate,
+        "payload_kb": args.payload_kb,
+        "round": args.round
+    }
+    results = []
+    print(f"{'targets':>8} {'wall(s)':>9} {'req':>7} {'req/s':>8} {'rss(MB)':>8}  phases")
+    for size in [int(value) for value in args.sizes.split(",") if value]:
+        result = run_pipeline(size, options, not args.github_rest, args.verbose, args.bark_devices, args.webhook, args.consensus)
+        results.append(result)
+        phases = " ".join(f"{phase}={seconds}" for phase, seconds in result["phases"].items())
+        print(f"{result['targets']:>8} {result['wall_time']:>9} {result['requests']:>7} {result['requests_per_sec']:>8} {result['peak_rss_mb']:>8}  {phases}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
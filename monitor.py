@@ -3,11 +3,28 @@ import json
 import os
 import time
 import re
+import asyncio
+import io
+import gzip
+import base64
+import hashlib
+import hmac
+import signal
+import sqlite3
+import zlib
+import argparse
+import threading
+import collections
+import functools
 import concurrent.futures
-import feedparser
-from google_play_scraper import app as play_app
+import email.utils
+from urllib.parse import urlparse, parse_qsl, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import importlib
+import xml.etree.ElementTree as ET
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from urllib3.response import HTTPResponse
 
 # ==========================================
 #             第一部分：用户配置区
@@ -221,13 +238,276 @@ BARK_ARCHIVE_MAPPING = {
 
 # 13. Bark Key
 # 请在 Repository Secrets 中配置密钥，无需在此处填写
+# 支持多台设备：多个 Key 之间用英文逗号分隔
 BARK_KEY = os.environ.get("BARK_KEY")
+BARK_KEYS = [key.strip() for key in (BARK_KEY or "").split(",") if key.strip()]
+# Bark 每台设备每秒最多推送次数
+BARK_RATE_PER_SEC = 5
+
+# 通用 Webhook 推送目标 (可选)，与 Bark 同时推送
+# 格式：{"url": "地址", "format": "json" 或 "text", "rate_per_sec": 每秒最多推送次数, "groups": ["仅推送的分组", ...]}
+# json 格式推送 {"title", "body", "group", "archive", "icon", "image"}；text 格式推送 "标题\n内容" 纯文本
+WEBHOOK_SINKS = []
+
+# 14. 高级设置
+# 一般无需修改
+# 上游接口地址 (基准测试或使用自建代理时替换)
+APPSTORE_API_BASE = "https://itunes.apple.com"
+GOOGLE_PLAY_BASE = "https://play.google.com"
+TAPTAP_BASE = "https://www.taptap.cn"
+GITHUB_API_BASE = "https://api.github.com"
+BARK_SERVER = os.environ.get("BARK_SERVER", "https://api.day.app")
+# App Store 批量查询：同一地区的应用合并为一次 lookup 请求，每次最多包含的 ID 数量
+APPSTORE_BATCH_SIZE = 100
+# App Store 多路采样 (可选)：对指定应用并发发起多次不同形式的查询，只有达到法定票数的版本才会被采纳
+# 用于规避 CDN 边缘缓存在新旧版本间来回切换导致的误推送；格式为应用名称列表，["*"] 表示全部 App Store 应用
+APPSTORE_CONSENSUS_APPS = []
+APPSTORE_CONSENSUS_SAMPLES = 3
+APPSTORE_CONSENSUS_QUORUM = 2
+# 每个域名的默认最大并发数，同时决定共享连接池中每个域名保持的连接数
+FETCH_MAX_WORKERS = 5
+# 统一检查引擎：所有平台的目标同时调度，全局最大并发数
+ENGINE_MAX_CONCURRENCY = 16
+# 按域名单独设置最大并发数，未配置的域名使用 FETCH_MAX_WORKERS
+ENGINE_HOST_CONCURRENCY = {
+    "play.google.com": 3
+}
+# 域名熔断：同一域名连续失败达到该次数后，本轮剩余任务直接跳过 (沿用历史记录)，不再占用并发与重试额度
+CIRCUIT_BREAKER_THRESHOLD = 3
+# 失败与被熔断跳过的任务在本轮末尾统一重试一次，等待时间遵循 Retry-After / 频率限制响应头
+# 需要等待的时间超过该上限 (秒) 时放弃重试；设置为 -1 关闭重试队列
+RETRY_QUEUE_MAX_WAIT = 30
+# TapTap 页面流式读取：找到版本号后立即断开，最多读取的字节数
+TAPTAP_MAX_BYTES = 2 * 1024 * 1024
+# Google Play：直接请求详情页并只解析版本号所在的数据块，最多读取的字节数
+# 原生解析失败时是否退回 google_play_scraper 完整解析
+GOOGLE_PLAY_MAX_BYTES = 4 * 1024 * 1024
+GOOGLE_PLAY_SCRAPER_FALLBACK = True
+# RSS 订阅：单次抓取的最长耗时 (秒) 与最大字节数；游标丢失时单次最多上报的新条目数
+RSS_FETCH_DEADLINE = 20
+RSS_MAX_BYTES = 5 * 1024 * 1024
+RSS_MAX_NEW_ENTRIES = 10
+# GitHub：配置环境变量 GITHUB_TOKEN 后通过 GraphQL 批量查询所有仓库，否则逐个调用 REST API
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+GITHUB_GRAPHQL_BATCH_SIZE = 50
+# API 剩余额度低于该值时推迟本轮 GitHub 检查，等待额度重置
+GITHUB_MIN_RATE_REMAINING = 5
+# 自适应轮询：每个目标按 "距上次版本变化的时长 × 比例" 计算检查间隔，限制在最短/最长间隔之间
+# 长期未更新的目标逐渐降低检查频率，刚更新过的目标保持高频检查
+POLL_MIN_INTERVAL = 15 * 60
+POLL_MAX_INTERVAL = 6 * 60 * 60
+POLL_BACKOFF_RATIO = 0.05
+# 定时任务触发时间存在抖动，提前该秒数到期的目标也视为到期
+POLL_GRACE_SECONDS = 120
+# 发布日配置：在指定的星期几始终按最短间隔检查 (0=周一 ... 6=周日，按 POLL_TIMEZONE 时区计算)
+# 格式：{"应用名称": [星期几, ...]}
+POLL_RELEASE_DAYS = {}
+POLL_TIMEZONE = 8
+# 高优先级目标：固定检查间隔 (秒)，不受自适应轮询影响；常驻模式 (--daemon) 下可设置为 1 分钟以内
+# 格式：{"应用名称": 间隔秒数}
+POLL_PRIORITY_INTERVALS = {}
+# 常驻模式下内部调度器的检查周期 (秒)
+DAEMON_TICK_SECONDS = 15
+# 推送接收 (--listen 主机:端口，随常驻模式运行)：接收 GitHub release webhook 与 WebSub 内容推送并立即处理
+# GitHub webhook 地址为 http://主机:端口/github，WebSub 回调地址为 http://主机:端口/websub
+RECEIVER_GITHUB_PATH = "/github"
+RECEIVER_WEBSUB_PATH = "/websub"
+# 签名密钥：GitHub 校验 X-Hub-Signature-256，WebSub 校验 X-Hub-Signature
+# 未配置密钥的入口不会启用，两个密钥都未配置时接收器拒绝启动
+RECEIVER_GITHUB_SECRET = os.environ.get("RECEIVER_GITHUB_SECRET")
+RECEIVER_WEBSUB_SECRET = os.environ.get("RECEIVER_WEBSUB_SECRET")
+RECEIVER_MAX_BODY = 5 * 1024 * 1024
+# 接收器运行时，收到过推送的目标改为按该间隔 (秒) 兜底轮询
+RECEIVER_SAFETY_INTERVAL = 86400
+# 每个目标在历史记录中保留的最近版本数量，检测到其中任意一个旧版本时判定为缓存回滚
+VERSION_HISTORY_SIZE = 5
+# 同一个被判定为回滚的版本 (低于本地版本或近期出现过) 连续出现该次数后视为真实回退 (如撤回发布) 并推送；0 = 始终拒绝
+ROLLBACK_CONFIRM_CHECKS = 3
+# 日志级别：debug / info / quiet (仅显示警告与错误)
+LOG_LEVEL = os.environ.get("MONITOR_LOG_LEVEL", "info")
+# 运行报告：每次运行结束后写入 JSON 报告与 Prometheus textfile (留空则不写入)
+RUN_REPORT_FILE = os.environ.get("RUN_REPORT_FILE", "run_report.json")
+PROMETHEUS_TEXTFILE = os.environ.get("PROMETHEUS_TEXTFILE", "monitor.prom")
+# 设置环境变量 FORCE_FULL_CHECK=1 可忽略轮询计划，检查全部目标
+FORCE_FULL_CHECK = os.environ.get("FORCE_FULL_CHECK", "").lower() in ("1", "true", "yes")
+# 版本历史记录文件
+HISTORY_FILE = "version_history.json"
+# 历史记录存储后端："sqlite" (默认，按键增量写入，首次运行时自动从 HISTORY_FILE 迁移) 或 "json"
+HISTORY_BACKEND = os.environ.get("HISTORY_BACKEND", "sqlite")
+HISTORY_DB_FILE = os.path.join(os.path.dirname(HISTORY_FILE), "version_history.db")
+# 条件请求缓存 (ETag / Last-Modified)，与历史记录文件放在同一目录
+HTTP_CACHE_FILE = os.path.join(os.path.dirname(HISTORY_FILE), "http_cache.json")
+# 轮询进度 (每个目标的上次检查时间) 单独保存在该文件中，不写入历史记录
+# 历史记录只在版本等内容变化时才改变，提交到仓库的数据库不会因为每轮例行检查而变化
+SCHEDULE_FILE = os.path.join(os.path.dirname(HISTORY_FILE), "poll_schedule.json")
+# 分片运行 (--shard i/N) 时各分片结果增量文件的默认目录，合并步骤 (--merge) 从这里读取
+SHARD_DELTA_DIR = os.path.join(os.path.dirname(HISTORY_FILE), "shard_deltas")
+# 推送发件箱：检查结束后先把渲染好的分组消息写入发件箱，再由投递步骤逐个推送目标发送
+# SQLite 后端写入同一个数据库，JSON 后端写入 OUTBOX_FILE；失败的消息保留到之后的运行中重试
+OUTBOX_FILE = os.path.join(os.path.dirname(HISTORY_FILE), "notification_outbox.json")
+OUTBOX_MAX_ATTEMPTS = 10
+# 重试间隔 (秒)：首次失败后等待 OUTBOX_RETRY_DELAY，之后每次翻倍，最长 OUTBOX_MAX_RETRY_DELAY
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_MAX_RETRY_DELAY = 3600
+# False 时检查阶段只写入发件箱，由 --drain-only 单独投递
+OUTBOX_DRAIN_INLINE = True
 
 # ==========================================
 #             第二部分：功能函数区
 # ==========================================
 
-def get_retry_session(retries=3, backoff_factor=0.5):
+LOG_LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+
+def log(message, level="info"):
+    threshold = LOG_LEVELS["warn"] if LOG_LEVEL == "quiet" else LOG_LEVELS.get(LOG_LEVEL, LOG_LEVELS["info"])
+    if LOG_LEVELS[level] >= threshold:
+        print(message)
+
+# 运行指标：记录每次抓取与推送的耗时、重试次数、状态码、接收字节数，以及每个目标的检查结果
+# 抓取期间的 HTTP 响应通过 session 的 response hook 收集到当前线程的上下文中
+_fetch_context = threading.local()
+
+def collect_response(resp, *args, **kwargs):
+    responses = getattr(_fetch_context, "responses", None)
+    if responses is not None:
+        responses.append(resp)
+    return resp
+
+def summarize_responses(responses):
+    retries = 0
+    bytes_received = 0
+    for resp in responses:
+        retry_state = getattr(resp.raw, "retries", None)
+        if retry_state is not None:
+            retries += len(retry_state.history)
+        try:
+            bytes_received += resp.raw.tell()
+        except Exception:
+            bytes_received += int(resp.headers.get("Content-Length") or 0)
+    status = responses[-1].status_code if responses else None
+    return status, retries, bytes_received
+
+class RunMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.fetches = []
+            self.notifications = []
+            self.outcomes = {}
+            self.skipped = collections.Counter()
+
+    def record_fetch(self, platform, host, targets, latency, responses, ok):
+        status, retries, bytes_received = summarize_responses(responses)
+        with self.lock:
+            self.fetches.append({
+                "platform": platform,
+                "host": host,
+                "targets": targets,
+                "latency": round(latency, 4),
+                "requests": len(responses),
+                "status": status,
+                "retries": retries,
+                "bytes": bytes_received,
+                "ok": ok
+            })
+
+    def record_notification(self, title, latency, responses, ok):
+        status, retries, bytes_received = summarize_responses(responses)
+        with self.lock:
+            self.notifications.append({
+                "title": title,
+                "latency": round(latency, 4),
+                "status": status,
+                "retries": retries,
+                "bytes": bytes_received,
+                "ok": ok
+            })
+
+    def record_skip(self, host, targets):
+        with self.lock:
+            self.skipped[host] += targets
+
+    def record_outcome(self, key, name, platform, outcome):
+        with self.lock:
+            self.outcomes[key] = {"name": name, "platform": platform, "outcome": outcome}
+
+    def report(self):
+        with self.lock:
+            hosts = {}
+            for fetch in self.fetches:
+                host = hosts.setdefault(fetch["host"], {"fetches": 0, "requests": 0, "failed": 0, "skipped": 0, "retries": 0, "bytes": 0, "latency": 0.0})
+                host["fetches"] += 1
+                host["requests"] += fetch["requests"]
+                host["failed"] += 0 if fetch["ok"] else 1
+                host["retries"] += fetch["retries"]
+                host["bytes"] += fetch["bytes"]
+                host["latency"] = round(host["latency"] + fetch["latency"], 4)
+            for host_name, targets in self.skipped.items():
+                host = hosts.setdefault(host_name, {"fetches": 0, "requests": 0, "failed": 0, "skipped": 0, "retries": 0, "bytes": 0, "latency": 0.0})
+                host["skipped"] = targets
+            outcome_counts = collections.Counter(item["outcome"] for item in self.outcomes.values())
+            return {
+                "started": int(self.started),
+                "duration": round(time.time() - self.started, 3),
+                "hosts": hosts,
+                "outcomes": dict(outcome_counts),
+                "targets": dict(self.outcomes),
+                "fetches": list(self.fetches),
+                "notifications": list(self.notifications)
+            }
+
+    def write_json(self, path, report=None):
+        report = report or self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, path, report=None):
+        report = report or self.report()
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        lines = [
+            "# TYPE monitor_run_duration_seconds gauge",
+            f"monitor_run_duration_seconds {report['duration']}",
+            f"monitor_run_timestamp_seconds {report['started']}"
+        ]
+        host_metrics = [("fetches", "monitor_host_fetches_total"), ("requests", "monitor_host_requests_total"),
+                        ("failed", "monitor_host_failed_fetches_total"), ("skipped", "monitor_host_skipped_targets_total"), ("retries", "monitor_host_retries_total"),
+                        ("bytes", "monitor_host_bytes_received_total"), ("latency", "monitor_host_fetch_seconds_total")]
+        for field, metric in host_metrics:
+            lines.append(f"# TYPE {metric} gauge")
+            for host, stats in report["hosts"].items():
+                lines.append(f'{metric}{{host="{label(host)}"}} {stats[field]}')
+        lines.append("# TYPE monitor_target_outcome gauge")
+        for key, item in report["targets"].items():
+            lines.append(f'monitor_target_outcome{{key="{label(key)}",name="{label(item["name"])}",platform="{label(item["platform"])}",outcome="{item["outcome"]}"}} 1')
+        lines.append("# TYPE monitor_notifications_total gauge")
+        sent = sum(1 for item in report["notifications"] if item["ok"])
+        lines.append(f'monitor_notifications_total{{result="ok"}} {sent}')
+        lines.append(f'monitor_notifications_total{{result="failed"}} {len(report["notifications"]) - sent}')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+METRICS = RunMetrics()
+
+def write_run_report():
+    report = METRICS.report()
+    if RUN_REPORT_FILE:
+        METRICS.write_json(RUN_REPORT_FILE, report)
+    if PROMETHEUS_TEXTFILE:
+        METRICS.write_prometheus(PROMETHEUS_TEXTFILE, report)
+    slowest = sorted(report["hosts"].items(), key=lambda pair: pair[1]["latency"], reverse=True)[:3]
+    summary = ", ".join(f"{host} {stats['latency']:.1f}s" for host, stats in slowest)
+    log(f"📊 本轮耗时 {report['duration']}s，结果统计: {report['outcomes']}" + (f"，耗时最多: {summary}" if summary else ""), "warn")
+
+def get_retry_session(retries=3, backoff_factor=0.5, pool_size=None, cassette=None):
+    if pool_size is None:
+        pool_size = max([FETCH_MAX_WORKERS] + list(ENGINE_HOST_CONCURRENCY.values()))
     session = requests.Session()
     session.headers.update({
         "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -242,205 +522,1476 @@ def get_retry_session(retries=3, backoff_factor=0.5):
         connect=retries,
         backoff_factor=backoff_factor,
         status_forcelist=[500, 502, 503, 504, 520, 521, 522, 524],
-        allowed_methods=["HEAD", "GET", "OPTIONS", "TRACE"]
+        allowed_methods=["HEAD", "GET", "OPTIONS", "TRACE"],
+        # 不在工作线程内按 Retry-After 休眠；重试用尽后返回最后一次响应 (而非抛出异常)，
+        # 由 HostHealth 记录服务端要求的重试时间，等待交给本轮末尾的重试队列
+        respect_retry_after_header=False,
+        raise_on_status=False
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    if cassette is not None:
+        adapter = CassetteAdapter(cassette, max_retries=retry, pool_connections=20, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=20, pool_maxsize=pool_size)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    session.hooks["response"].append(collect_response)
     return session
 
-def worker_appstore(item):
-    name, app_id = item[0], item[1]
-    country = item[2] if len(item) > 2 else "cn"
-    return item, get_appstore_version(app_id, country)
+# 全进程共享的 HTTP 客户端：所有抓取函数与 Bark 推送复用同一个连接池 (keep-alive)
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session():
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = get_retry_session()
+    return _shared_session
+
+def set_shared_session(session):
+    # 用于测试或自定义传输层：注入自定义客户端，传入 None 则在下次使用时重建默认客户端
+    global _shared_session
+    with _shared_session_lock:
+        old_session = _shared_session
+        _shared_session = session
+    if old_session is not None and old_session is not session:
+        old_session.close()
+
+# 录制 / 回放：--record 将本次运行的所有上游响应写入 gzip 压缩的 JSON 录像文件，--replay 从录像文件返回响应，不访问网络
+# 请求按 (方法, 去掉防缓存参数并排序后的 URL, 请求体摘要) 匹配，同一请求的多次响应按录制顺序依次返回
+CASSETTE_IGNORED_PARAMS = {"t"}
+CASSETTE_DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+def cassette_key(request):
+    parsed = urlparse(request.url)
+    query = sorted((name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True) if name not in CASSETTE_IGNORED_PARAMS)
+    key = f"{request.method} {parsed.scheme}://{parsed.netloc}{parsed.path}?{urlencode(query)}"
+    if request.body:
+        body = request.body if isinstance(request.body, bytes) else request.body.encode("utf-8")
+        key += " #" + hashlib.sha1(body).hexdigest()[:12]
+    return key
+
+class Cassette:
+    def __init__(self, path, mode, timing="fast"):
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.interactions = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for interaction in json.load(f)["interactions"]:
+                    self.interactions.setdefault(interaction["key"], []).append(interaction)
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def record(self, request, resp, elapsed, error=None):
+        interaction = {"key": cassette_key(request), "elapsed": round(elapsed, 4)}
+        if error is not None:
+            interaction["error"] = str(error)
+        else:
+            interaction.update({
+                "status": resp.status_code,
+                "reason": resp.reason,
+                "headers": {name: value for name, value in resp.headers.items() if name.lower() not in CASSETTE_DROPPED_HEADERS},
+                "body": base64.b64encode(resp.content).decode("ascii")
+            })
+        with self.lock:
+            self.interactions.setdefault(interaction["key"], []).append(interaction)
+
+    def next_interaction(self, key):
+        # 录制次数用完后重复返回最后一次响应
+        with self.lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            return recorded[min(position, len(recorded) - 1)]
+
+    def save(self):
+        if self.mode != "record":
+            return
+        with self.lock:
+            interactions = [interaction for recorded in self.interactions.values() for interaction in recorded]
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            json.dump({"version": 1, "interactions": interactions}, f, ensure_ascii=False)
+        log(f"📼 已录制 {len(interactions)} 个响应到 {self.path}", "warn")
+
+def is_delivery_request(request):
+    # 推送请求 (Bark / Webhook) 的地址含有设备密钥，录制与回放时都不真正发送，也不写入录像文件
+    urls = [BARK_SERVER] + [conf["url"] for conf in WEBHOOK_SINKS]
+    return any(request.url.startswith(url) for url in urls if url)
+
+class CassetteAdapter(HTTPAdapter):
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        if is_delivery_request(request):
+            return self.build_raw_response(request, 200, {"Content-Type": "application/json"}, b'{"code": 200, "message": "cassette"}')
+        if self.cassette.replaying:
+            return self.replay(request)
+        started = time.monotonic()
+        try:
+            resp = super().send(request, **kwargs)
+            resp.content  # 录制时完整读取响应体，调用方仍可照常流式读取
+        except requests.RequestException as e:
+            self.cassette.record(request, None, time.monotonic() - started, error=e)
+            raise
+        self.cassette.record(request, resp, time.monotonic() - started)
+        return resp
+
+    def replay(self, request):
+        key = cassette_key(request)
+        interaction = self.cassette.next_interaction(key)
+        if interaction is None:
+            raise requests.ConnectionError(f"录像文件中没有该请求: {key}", request=request)
+        if self.cassette.timing == "recorded":
+            time.sleep(interaction["elapsed"])
+        if "error" in interaction:
+            raise requests.ConnectionError(interaction["error"], request=request)
+        return self.build_raw_response(request, interaction["status"], interaction["headers"],
+                                       base64.b64decode(interaction["body"]), interaction.get("reason"))
+
+    def build_raw_response(self, request, status, headers, body, reason=None):
+        headers = dict(headers, **{"Content-Length": str(len(body))})
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status,
+                           reason=reason, preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+ACTIVE_CASSETTE = None
+
+def install_cassette(path, mode, timing="fast"):
+    global ACTIVE_CASSETTE
+    ACTIVE_CASSETTE = Cassette(path, mode, timing)
+    set_shared_session(get_retry_session(cassette=ACTIVE_CASSETTE))
+    return ACTIVE_CASSETTE
+
+# 历史记录存储：统一的 load_all / upsert_many 接口，只写入本轮发生变化的键
+class HistoryStore:
+    def load_all(self):
+        raise NotImplementedError
+
+    def upsert_many(self, records):
+        raise NotImplementedError
+
+    def outbox(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def write_json_atomic(path, data, indent=2):
+    # 先写临时文件再原子替换，写入中途崩溃不会破坏原文件
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_history_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"历史记录文件 {path} 已损坏，请手动修复或删除后重试: {e}")
+
+class JsonHistoryStore(HistoryStore):
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.notification_outbox = None
+
+    def load_all(self):
+        self.data = read_history_json(self.path)
+        return dict(self.data)
+
+    def upsert_many(self, records):
+        if not records:
+            return
+        if self.data is None:
+            self.data = read_history_json(self.path)
+        self.data.update(records)
+        write_json_atomic(self.path, self.data)
+
+    def outbox(self):
+        if self.notification_outbox is None:
+            self.notification_outbox = JsonOutbox(OUTBOX_FILE)
+        return self.notification_outbox
+
+class SqliteHistoryStore(HistoryStore):
+    def __init__(self, path, migrate_from=None):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at INTEGER NOT NULL)"
+            )
+        self.notification_outbox = None
+        if migrate_from:
+            self.migrate_json(migrate_from)
+
+    def migrate_json(self, json_path):
+        count = self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        if count or not os.path.exists(json_path):
+            return
+        records = read_history_json(json_path)
+        self.upsert_many(records)
+        log(f"📦 已从 {json_path} 迁移 {len(records)} 条历史记录")
+
+    def load_all(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT key, data FROM history").fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def upsert_many(self, records):
+        if not records:
+            return
+        now = int(time.time())
+        rows = [(key, json.dumps(value, ensure_ascii=False), now) for key, value in records.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO history (key, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                rows
+            )
+
+    def outbox(self):
+        if self.notification_outbox is None:
+            self.notification_outbox = SqliteOutbox(self.conn, self.lock)
+        return self.notification_outbox
+
+    def close(self):
+        self.conn.close()
+
+class ReadOnlyHistoryStore(HistoryStore):
+    # 录制 / 回放模式使用：照常读取历史记录但不写回，发件箱只存在于内存中
+    # 录像中的推送不会真正发送，不能把生产发件箱中的消息标记为已投递，也不能把本轮更新记为已推送
+    def __init__(self, store):
+        self.store = store
+        self.notification_outbox = JsonOutbox(None)
+
+    def load_all(self):
+        return self.store.load_all()
+
+    def upsert_many(self, records):
+        log(f"📼 录制 / 回放模式：跳过写入 {len(records)} 条历史记录", "debug")
+
+    def outbox(self):
+        return self.notification_outbox
+
+    def close(self):
+        self.store.close()
+
+# 推送发件箱存储：每行对应一个 (推送目标, 分组消息)，投递成功后删除，失败则记录重试次数与下次重试时间
+class NotificationOutbox:
+    def enqueue(self, entries):
+        raise NotImplementedError
+
+    def pending(self):
+        raise NotImplementedError
+
+    def complete(self, entry_ids):
+        raise NotImplementedError
+
+    def defer(self, entries):
+        raise NotImplementedError
+
+class JsonOutbox(NotificationOutbox):
+    # path 为 None 时只保存在内存中 (回放模式)
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+        self.next_id = 1
+
+    def load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"推送发件箱文件 {self.path} 已损坏，请手动修复或删除后重试: {e}")
+            self.entries = {entry["id"]: entry for entry in data.get("entries", [])}
+            self.next_id = data.get("next_id", max(self.entries, default=0) + 1)
+
+    def save(self):
+        if self.path:
+            write_json_atomic(self.path, {"next_id": self.next_id, "entries": list(self.entries.values())})
+
+    def enqueue(self, entries):
+        if not entries:
+            return
+        with self.lock:
+            self.load()
+            for entry in entries:
+                self.entries[self.next_id] = dict(entry, id=self.next_id, attempts=0, next_attempt=0)
+                self.next_id += 1
+            self.save()
+
+    def pending(self):
+        with self.lock:
+            self.load()
+            return [dict(entry) for entry in self.entries.values()]
+
+    def complete(self, entry_ids):
+        if not entry_ids:
+            return
+        with self.lock:
+            self.load()
+            for entry_id in entry_ids:
+                self.entries.pop(entry_id, None)
+            self.save()
+
+    def defer(self, entries):
+        if not entries:
+            return
+        with self.lock:
+            self.load()
+            for entry in entries:
+                if entry["id"] in self.entries:
+                    self.entries[entry["id"]].update(attempts=entry["attempts"], next_attempt=entry["next_attempt"])
+            self.save()
+
+class SqliteOutbox(NotificationOutbox):
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, sink TEXT NOT NULL, grp TEXT NOT NULL, message TEXT NOT NULL, "
+                "created_at INTEGER NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def enqueue(self, entries):
+        if not entries:
+            return
+        rows = [(entry["sink"], entry["group"], json.dumps(entry["message"], ensure_ascii=False), entry["created_at"]) for entry in entries]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO outbox (sink, grp, message, created_at) VALUES (?, ?, ?, ?)", rows)
+
+    def pending(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, sink, grp, message, created_at, attempts, next_attempt FROM outbox ORDER BY id"
+            ).fetchall()
+        return [{"id": row[0], "sink": row[1], "group": row[2], "message": json.loads(row[3]),
+                 "created_at": row[4], "attempts": row[5], "next_attempt": row[6]} for row in rows]
+
+    def complete(self, entry_ids):
+        if not entry_ids:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+
+    def defer(self, entries):
+        if not entries:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                                  [(entry["attempts"], entry["next_attempt"], entry["id"]) for entry in entries])
+
+def open_history_store(backend=None):
+    backend = backend or HISTORY_BACKEND
+    if backend == "json":
+        store = JsonHistoryStore(HISTORY_FILE)
+    elif backend == "sqlite":
+        store = SqliteHistoryStore(HISTORY_DB_FILE, migrate_from=HISTORY_FILE)
+    else:
+        raise ValueError(f"未知的历史记录存储后端: {backend}")
+    if ACTIVE_CASSETTE is not None:
+        return ReadOnlyHistoryStore(store)
+    return store
+
+# 只属于轮询进度的字段：保存在 POLL_SCHEDULE 中，写入历史记录前去除
+SCHEDULE_FIELDS = ("last_check",)
+
+def persisted_record(record):
+    if not isinstance(record, dict):
+        return record
+    return {field: value for field, value in record.items() if field not in SCHEDULE_FIELDS}
+
+def diff_history(old_history, new_history):
+    changed = {}
+    for key, value in new_history.items():
+        record = persisted_record(value)
+        if persisted_record(old_history.get(key)) != record:
+            changed[key] = record
+    return changed
+
+def schedule_changes(old_history, new_history):
+    changes = {}
+    for key, value in new_history.items():
+        last_check = value.get("last_check") if isinstance(value, dict) else None
+        old_value = old_history.get(key)
+        if last_check and (not isinstance(old_value, dict) or old_value.get("last_check") != last_check):
+            changes[key] = last_check
+    return changes
+
+class PollSchedule:
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            log("⚠️ 警告：轮询进度文件损坏，已忽略。", "warn")
+
+    def apply(self, history):
+        # 将轮询进度合并回内存中的历史记录，供调度判断使用
+        with self.lock:
+            for key, last_check in self.entries.items():
+                if isinstance(history.get(key), dict):
+                    history[key] = dict(history[key], last_check=last_check)
+        return history
+
+    def update(self, changes):
+        with self.lock:
+            for key, last_check in changes.items():
+                if last_check > self.entries.get(key, 0):
+                    self.entries[key] = last_check
+                    self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            write_json_atomic(self.path, self.entries)
+            self.dirty = False
+
+POLL_SCHEDULE = PollSchedule()
+
+def load_history(store):
+    return POLL_SCHEDULE.apply(store.load_all())
+
+# 条件请求缓存：记录上游返回的 ETag / Last-Modified 及对应的解析结果
+# 下次请求时携带 If-None-Match / If-Modified-Since，上游返回 304 时直接沿用缓存结果，无需下载和解析
+class ConditionalCache:
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.changes = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        self.path = path
+        self.entries = {}
+        self.changes = {}
+        self.dirty = False
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            log("⚠️ 警告：条件请求缓存文件损坏，已忽略。", "warn")
+
+    def request_headers(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def cached_value(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry.get("value") if entry else None
+
+    def store(self, key, resp, value):
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        with self.lock:
+            if value is None or not (etag or last_modified):
+                if self.entries.pop(key, None) is not None:
+                    self.changes[key] = None
+                    self.dirty = True
+                return
+            entry = {"etag": etag, "last_modified": last_modified, "value": value}
+            if self.entries.get(key) != entry:
+                self.entries[key] = entry
+                self.changes[key] = entry
+                self.dirty = True
+
+    def apply(self, changes):
+        # 合并其他进程 (分片) 本轮产生的缓存变更，None 表示该条目已失效
+        with self.lock:
+            for key, entry in changes.items():
+                if entry is None:
+                    self.entries.pop(key, None)
+                else:
+                    self.entries[key] = entry
+                self.dirty = True
+
+    def save(self):
+        if not self.path or (not self.dirty and os.path.exists(self.path)):
+            return
+        with self.lock:
+            write_json_atomic(self.path, self.entries)
+            self.dirty = False
+
+HTTP_CACHE = ConditionalCache()
+
+def conditional_get(url, cache_key=None, headers=None, **kwargs):
+    request_headers = dict(headers or {})
+    request_headers.update(HTTP_CACHE.request_headers(cache_key or url))
+    return get_shared_session().get(url, headers=request_headers, **kwargs)
+
+def chunk_by_id(items, batch_size, id_of):
+    # 按去重后的 ID 分块，同一 ID 的多个条目 (不同显示名称) 落在同一批次，只查询一次
+    items_by_id = {}
+    for item in items:
+        items_by_id.setdefault(id_of(item), []).append(item)
+    ids = list(items_by_id)
+    return [[item for item_id in ids[i:i + batch_size] for item in items_by_id[item_id]] for i in range(0, len(ids), batch_size)]
+
+def group_appstore_list(data_list, batch_size=APPSTORE_BATCH_SIZE):
+    groups = {}
+    for item in data_list:
+        country = item[2] if len(item) > 2 else PLATFORMS["App Store"].defaults["country"]
+        groups.setdefault(country, []).append(item)
+    batches = []
+    for country, items in groups.items():
+        for chunk in chunk_by_id(items, batch_size, lambda item: str(item[1])):
+            batches.append((country, chunk))
+    return batches
+
+# 请求合并 (singleflight)：同一轮中按规范化的请求键共享抓取结果
+# 并发的相同请求只有第一个真正发出，其余等待其结果；成功结果在本轮内复用，失败结果不缓存以便重试
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+
+    def do(self, key, func, *args):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = concurrent.futures.Future()
+        if not leader:
+            return call.result()
+        try:
+            result = func(*args)
+        except Exception as e:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.set_exception(e)
+            raise
+        if result is None:
+            with self.lock:
+                self.calls.pop(key, None)
+        call.set_result(result)
+        return result
+
+FETCH_FLIGHTS = SingleFlight()
+
+def needs_consensus(item):
+    return "*" in APPSTORE_CONSENSUS_APPS or item[0] in APPSTORE_CONSENSUS_APPS
+
+def vote_version(samples):
+    votes = collections.Counter(version for version in samples if version)
+    if not votes:
+        return None, 0
+    return votes.most_common(1)[0]
+
+def fetch_appstore_sample(responses, app_ids, country, variant):
+    # 采样线程沿用发起方的响应记录列表，保证指标仍归属于当前批次
+    _fetch_context.responses = responses
+    try:
+        return get_appstore_versions(app_ids, country, variant)
+    finally:
+        _fetch_context.responses = None
+
+def worker_appstore_batch(batch):
+    country, items = batch
+    app_ids = list(dict.fromkeys(str(item[1]) for item in items))
+    consensus_ids = list(dict.fromkeys(str(item[1]) for item in items if needs_consensus(item)))
+    # 第 0 路为常规批量查询 (覆盖全部 ID)，其余各路只查询需要多路采样的 ID，与常规查询并发执行
+    sample_count = max(1, APPSTORE_CONSENSUS_SAMPLES) if consensus_ids else 1
+    if sample_count == 1:
+        samples = [get_appstore_versions(app_ids, country)]
+    else:
+        responses = getattr(_fetch_context, "responses", None)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=sample_count) as executor:
+            futures = [executor.submit(fetch_appstore_sample, responses, app_ids, country, 0)]
+            futures += [executor.submit(fetch_appstore_sample, responses, consensus_ids, country, variant) for variant in range(1, sample_count)]
+            samples = [future.result() for future in futures]
+    versions = samples[0]
+    results = []
+    for item in items:
+        app_id = str(item[1])
+        fetched_ver = None
+        if app_id in consensus_ids:
+            fetched_ver, count = vote_version([(sample or {}).get(app_id) for sample in samples])
+            if fetched_ver and count < APPSTORE_CONSENSUS_QUORUM:
+                log(f"🗳️ [多路采样] {item[0]}: 版本 {fetched_ver} 仅获得 {count}/{sample_count} 票，暂不采纳", "warn")
+                fetched_ver = None
+        elif versions is not None:
+            fetched_ver = versions.get(app_id)
+        if versions is not None and not versions.get(app_id) and not fetched_ver:
+            log(f"⚠️ [App Store Warning] {item[0]}: ID {item[1]} 在 {country} 区查询结果中不存在", "warn")
+        results.append((item, fetched_ver))
+    return results
 
 def worker_googleplay(item):
     name, pkg_name = item[0], item[1]
-    country = item[2] if len(item) > 2 else "us"
-    return item, get_googleplay_version(pkg_name, country)
+    country = item[2] if len(item) > 2 else PLATFORMS["Google Play"].defaults["country"]
+    return item, FETCH_FLIGHTS.do(("Google Play", pkg_name, country), get_googleplay_version, pkg_name, country)
 
 def worker_taptap(item):
     name, app_id = item[0], item[1]
-    return item, get_taptap_version(app_id)
+    return item, FETCH_FLIGHTS.do(("TapTap", str(app_id)), get_taptap_version, app_id)
+
+def worker_github_batch(items):
+    repos = list(dict.fromkeys(item[1] for item in items))
+    versions = get_github_versions(repos)
+    return [(item, versions.get(item[1]) if versions else None) for item in items]
 
 def worker_github(item):
     name, repo = item[0], item[1]
-    return item, get_github_version(repo)
+    return item, FETCH_FLIGHTS.do(("GitHub", repo.lower()), get_github_version, repo)
 
-def worker_rss(item):
+def feed_is_conditional(rss_url, cursor):
+    # 条件请求的校验值按订阅链接缓存，游标按条目保存：只有缓存的最新条目与该条目的游标一致时，304 才表示该条目没有新内容
+    # 否则 (新条目、或同一订阅的其他条目先刷新了校验值) 需要完整内容，同一订阅的这类条目合并为一次无条件请求
+    return cursor is not None and HTTP_CACHE.cached_value(rss_url) == cursor
+
+def worker_rss(arg):
+    item, cursor = arg
     name, rss_url = item[0], item[1]
-    regex_pattern = RSS_REGEX_RULES.get(name, None)
-    return item, get_rss_latest(rss_url, regex_pattern)
+    # 同一订阅链接只下载一次，各条目用各自的过滤规则与游标解析共享的原始内容
+    conditional = feed_is_conditional(rss_url, cursor)
+    feed = FETCH_FLIGHTS.do(("RSS", rss_url, conditional), fetch_rss_feed, rss_url, conditional)
+    return item, get_rss_latest(rss_url, get_app_config(name, "RSS").entry_rule, cursor, feed=feed)
 
-def fetch_parallel(data_list, worker_func, max_workers=5):
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_item = {executor.submit(worker_func, item): item for item in data_list}
-        for future in concurrent.futures.as_completed(future_to_item):
-            try:
-                results.append(future.result())
-            except Exception as e:
-                print(f"⚠️ 线程异常: {e}")
-    return results
+# 检查任务：一个任务可包含多个监控项 (如 App Store 批量查询)，执行后返回 [(item, fetched_ver), ...]
+CheckTask = collections.namedtuple("CheckTask", ["platform", "host", "func", "arg", "items"])
+
+def make_history_key(platform, item):
+    return PLATFORMS[platform].make_key(item)
+
+def get_poll_interval(name, record, now):
+    if name in POLL_PRIORITY_INTERVALS:
+        return POLL_PRIORITY_INTERVALS[name]
+    weekday = time.gmtime(now + POLL_TIMEZONE * 3600).tm_wday
+    if weekday in POLL_RELEASE_DAYS.get(name, []):
+        return POLL_MIN_INTERVAL
+    last_change = record.get("last_change")
+    if not last_change:
+        return POLL_MIN_INTERVAL
+    interval = (now - last_change) * POLL_BACKOFF_RATIO
+    return min(POLL_MAX_INTERVAL, max(POLL_MIN_INTERVAL, interval))
+
+def is_target_due(name, key, history, now):
+    record = history.get(key)
+    if FORCE_FULL_CHECK or not isinstance(record, dict) or not record.get("last_check"):
+        return True
+    interval = get_poll_interval(name, record, now)
+    if RECEIVER_ACTIVE and record.get("pushed_at"):
+        interval = max(interval, RECEIVER_SAFETY_INTERVAL)
+    next_due = record["last_check"] + interval
+    return now >= next_due - min(POLL_GRACE_SECONDS, interval / 2)
+
+def parse_shard(value):
+    match = re.fullmatch(r'(\d+)/(\d+)', value.strip())
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/N (0 <= i < N): {value}")
+    return int(match.group(1)), int(match.group(2))
+
+def in_shard(key, shard):
+    # 按历史记录键的 CRC32 划分，与进程、机器和 Python 哈希种子无关，同一目标始终落在同一分片
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(key.encode("utf-8")) % count == index
+
+def filter_due_items(platform, data_list, history, now, shard=None):
+    due_items = []
+    for item in data_list:
+        key = make_history_key(platform, item)
+        if in_shard(key, shard) and is_target_due(item[0], key, history, now):
+            due_items.append(item)
+    return due_items
+
+def build_check_tasks(history=None, now=None, shard=None):
+    if history is None: history = {}
+    if now is None: now = time.time()
+    tasks = []
+    for platform in PLATFORMS.values():
+        data_list = platform.items()
+        if not data_list:
+            continue
+        due_items = filter_due_items(platform.name, data_list, history, now, shard)
+        if due_items:
+            tasks.extend(platform.build_tasks(platform, due_items, history))
+    return tasks
+
+# 域名健康状态：连续失败计数 (熔断) 与服务端要求的最早重试时间
+def parse_retry_at(resp):
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return time.time() + int(retry_after)
+        try:
+            return email.utils.parsedate_to_datetime(retry_after).timestamp()
+        except (TypeError, ValueError):
+            return 0
+    if resp.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return float(resp.headers.get("X-RateLimit-Reset") or 0)
+        except ValueError:
+            return 0
+    return 0
 
-def get_check_config(app_name, platform):
-    if app_name in BUILD_NUMBER_CHECK_APPS:
-        if platform in BUILD_NUMBER_CHECK_APPS[app_name]:
-            return BUILD_NUMBER_CHECK_APPS[app_name][platform]
-    found_group = None
+class HostHealth:
+    def __init__(self):
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.hosts.clear()
+
+    def record(self, host, ok, responses):
+        retry_at = max((parse_retry_at(resp) for resp in responses), default=0)
+        with self.lock:
+            state = self.hosts.setdefault(host, {"failures": 0, "retry_at": 0})
+            state["retry_at"] = max(state["retry_at"], retry_at)
+            state["failures"] = 0 if ok else state["failures"] + 1
+            tripped = state["failures"] == CIRCUIT_BREAKER_THRESHOLD
+        if tripped:
+            log(f"🔌 [{host}] 连续失败 {CIRCUIT_BREAKER_THRESHOLD} 次，熔断该域名剩余任务", "warn")
+
+    def is_open(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+        return bool(state) and state["failures"] >= CIRCUIT_BREAKER_THRESHOLD
+
+    def retry_at(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+        return state["retry_at"] if state else 0
+
+    def half_open(self, host):
+        # 重试前半开熔断器：再失败一次即重新熔断
+        with self.lock:
+            state = self.hosts.get(host)
+            if state:
+                state["failures"] = min(state["failures"], CIRCUIT_BREAKER_THRESHOLD - 1)
+
+HOST_HEALTH = HostHealth()
+
+def run_task_func(task):
+    _fetch_context.responses = []
+    started = time.monotonic()
+    ok = False
+    try:
+        result = task.func(task.arg)
+        results = result if isinstance(result, list) else [result]
+        ok = any(fetched_ver is not None for _, fetched_ver in results)
+        return results
+    finally:
+        METRICS.record_fetch(task.platform, task.host, len(task.items), time.monotonic() - started, _fetch_context.responses, ok)
+        HOST_HEALTH.record(task.host, ok, _fetch_context.responses)
+        _fetch_context.responses = None
+
+def run_check_engine(tasks, on_result, max_concurrency=ENGINE_MAX_CONCURRENCY):
+    asyncio.run(_run_check_engine(tasks, on_result, max_concurrency))
+
+async def _run_check_engine(tasks, on_result, max_concurrency):
+    loop = asyncio.get_running_loop()
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = {}
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+    HOST_HEALTH.reset()
+    FETCH_FLIGHTS.reset()
+
+    def failed(task):
+        return [(item, None) for item in task.items]
+
+    async def run_one(task, deferred):
+        # deferred 为 None 时 (重试阶段) 失败结果直接交给 on_result，不再进入重试队列
+        if task.host not in host_limits:
+            host_limits[task.host] = asyncio.Semaphore(ENGINE_HOST_CONCURRENCY.get(task.host, FETCH_MAX_WORKERS))
+        async with host_limits[task.host]:
+            if HOST_HEALTH.is_open(task.host):
+                if deferred is None:
+                    METRICS.record_skip(task.host, len(task.items))
+                results = failed(task)
+            else:
+                async with global_limit:
+                    try:
+                        results = await loop.run_in_executor(executor, run_task_func, task)
+                    except Exception as e:
+                        log(f"⚠️ 线程异常: {e}", "error")
+                        results = failed(task)
+        if deferred is not None and all(fetched_ver is None for _, fetched_ver in results):
+            deferred.append(task)
+            return task, []
+        return task, results
+
+    async def run_all(batch, deferred):
+        for next_done in asyncio.as_completed([run_one(task, deferred) for task in batch]):
+            task, results = await next_done
+            for item, fetched_ver in results:
+                on_result(task.platform, item, fetched_ver)
+
+    async def retry_host(host, host_tasks):
+        wait = max(0.0, HOST_HEALTH.retry_at(host) - time.time())
+        if wait > RETRY_QUEUE_MAX_WAIT:
+            log(f"⏭️ [{host}] 服务端要求等待 {int(wait)} 秒，超过重试上限，{len(host_tasks)} 个任务沿用历史记录", "warn")
+            for task in host_tasks:
+                for item, fetched_ver in failed(task):
+                    on_result(task.platform, item, fetched_ver)
+            return
+        log(f"🔁 [{host}] {wait:.0f} 秒后重试 {len(host_tasks)} 个失败任务", "warn")
+        await asyncio.sleep(wait)
+        HOST_HEALTH.half_open(host)
+        await run_all(host_tasks, None)
+
+    try:
+        deferred = [] if RETRY_QUEUE_MAX_WAIT >= 0 else None
+        await run_all(tasks, deferred)
+        if deferred:
+            retry_queue = {}
+            for task in deferred:
+                retry_queue.setdefault(task.host, []).append(task)
+            await asyncio.gather(*(retry_host(host, host_tasks) for host, host_tasks in retry_queue.items()))
+    finally:
+        executor.shutdown(wait=False)
+
+def run_checks(history, tasks=None):
+    update_buffer = {}
+    current_state = {}
+    new_history = history.copy()
+    if tasks is None:
+        tasks = build_check_tasks(history)
+
+    def on_result(platform, item, fetched_ver):
+        name = item[0]
+        if name not in current_state: current_state[name] = {}
+        key = make_history_key(platform, item)
+        PLATFORMS[platform].process_result(name, key, fetched_ver, platform, history, new_history, current_state, update_buffer)
+
+    target_count = sum(len(task.items) for task in tasks)
+    log(f"\n>>> 本轮到期目标 {target_count} 个，共 {len(tasks)} 个任务 (统一调度，全局并发 {ENGINE_MAX_CONCURRENCY})...")
+    run_check_engine(tasks, on_result)
+    return new_history, current_state, update_buffer
+
+# 配置解析表：启动时将 APPS > GROUPS > GLOBAL 三级配置预先展开为 (应用名称, 平台) -> AppConfig
+AppConfig = collections.namedtuple("AppConfig", [
+    "group", "archive", "icon", "suffix_text", "suffix_visible", "build_check", "version_pattern", "entry_rule"
+])
+APP_CONFIG = {}
+BUILD_NUMBER_PATTERN = re.compile(r'\s*\(.*?\)')
+
+def get_platform_lists():
+    return [(platform.name, platform.items()) for platform in PLATFORMS.values()]
+
+def get_group_index():
+    group_index = {}
     for g_name, g_apps in NOTIFICATION_GROUPS.items():
-        if app_name in g_apps:
-            found_group = g_name
-            break
-    if found_group and found_group in BUILD_NUMBER_CHECK_GROUPS:
-        if platform in BUILD_NUMBER_CHECK_GROUPS[found_group]:
-            return BUILD_NUMBER_CHECK_GROUPS[found_group][platform]
-    return BUILD_NUMBER_CHECK_GLOBAL.get(platform, False)
+        for app_name in g_apps:
+            group_index.setdefault(app_name, g_name)
+    return group_index
+
+def resolve_app_config(app_name, platform, group):
+    def cascade(apps_conf, groups_conf, global_conf, default):
+        if platform in apps_conf.get(app_name, {}):
+            return apps_conf[app_name][platform]
+        if platform in groups_conf.get(group, {}):
+            return groups_conf[group][platform]
+        return global_conf.get(platform, default)
+    build_check = cascade(BUILD_NUMBER_CHECK_APPS, BUILD_NUMBER_CHECK_GROUPS, BUILD_NUMBER_CHECK_GLOBAL, False)
+    suffix_text, suffix_visible = cascade(SUFFIX_CONFIG_APPS, SUFFIX_CONFIG_GROUPS, SUFFIX_CONFIG_GLOBAL, [platform, True])
+    entry_rule = None
+    rule_table = PLATFORMS[platform].rule_table if platform in PLATFORMS else None
+    if rule_table and globals()[rule_table].get(app_name):
+        entry_rule = re.compile(globals()[rule_table][app_name], re.IGNORECASE)
+    return AppConfig(
+        group=group,
+        archive=BARK_ARCHIVE_MAPPING.get(group, group),
+        icon=NOTIFICATION_ICONS.get(group, DEFAULT_ICON),
+        suffix_text=suffix_text,
+        suffix_visible=suffix_visible,
+        build_check=build_check,
+        version_pattern=None if build_check else BUILD_NUMBER_PATTERN,
+        entry_rule=entry_rule
+    )
+
+def compile_app_config():
+    watched = {}
+    for platform, data_list in get_platform_lists():
+        for item in data_list:
+            watched.setdefault(item[0], set()).add(platform)
+    group_names = set(NOTIFICATION_GROUPS) | {DEFAULT_GROUP}
+    errors = []
+    name_sources = [
+        ("NOTIFICATION_GROUPS", [app for g_apps in NOTIFICATION_GROUPS.values() for app in g_apps]),
+        ("BUILD_NUMBER_CHECK_APPS", BUILD_NUMBER_CHECK_APPS),
+        ("SUFFIX_CONFIG_APPS", SUFFIX_CONFIG_APPS),
+        ("RSS_REGEX_RULES", RSS_REGEX_RULES),
+        ("RICH_MEDIA_CONFIG", RICH_MEDIA_CONFIG),
+        ("POLL_RELEASE_DAYS", POLL_RELEASE_DAYS),
+        ("POLL_PRIORITY_INTERVALS", POLL_PRIORITY_INTERVALS)
+    ]
+    for source, names in name_sources:
+        for app_name in names:
+            if app_name not in watched:
+                errors.append(f"{source}: 应用 '{app_name}' 不在任何监控列表中")
+    for source, groups in [("BUILD_NUMBER_CHECK_GROUPS", BUILD_NUMBER_CHECK_GROUPS), ("SUFFIX_CONFIG_GROUPS", SUFFIX_CONFIG_GROUPS)]:
+        for g_name in groups:
+            if g_name not in group_names:
+                errors.append(f"{source}: 分组 '{g_name}' 不在 NOTIFICATION_GROUPS 中")
+    if errors:
+        raise ValueError("配置错误：\n" + "\n".join(errors))
+    for source, entries in [("BUILD_NUMBER_CHECK_APPS", BUILD_NUMBER_CHECK_APPS), ("SUFFIX_CONFIG_APPS", SUFFIX_CONFIG_APPS)]:
+        for app_name, platform_conf in entries.items():
+            for platform in platform_conf:
+                if platform not in watched[app_name]:
+                    log(f"⚠️ 配置警告：{source}['{app_name}'] 中的平台 '{platform}' 未被监控，该项不会生效", "warn")
+    group_index = get_group_index()
+    table = {}
+    for app_name, platforms in watched.items():
+        group = group_index.get(app_name, DEFAULT_GROUP)
+        for platform in platforms:
+            table[(app_name, platform)] = resolve_app_config(app_name, platform, group)
+    APP_CONFIG.clear()
+    APP_CONFIG.update(table)
+    return APP_CONFIG
+
+def get_app_config(app_name, platform):
+    conf = APP_CONFIG.get((app_name, platform))
+    if conf is None:
+        conf = resolve_app_config(app_name, platform, get_group_index().get(app_name, DEFAULT_GROUP))
+    return conf
+
+# 版本模型：每个版本字符串只解析一次 (结果缓存)，得到用于比较的文本与可排序的语义键
+# 语义键 = (主版本号各段, 是否正式版, 预发布后缀, 括号内构建号)，无法解析为版本号时为 None
+ParsedVersion = collections.namedtuple("ParsedVersion", ["text", "key"])
+VERSION_NUMBER_PATTERN = re.compile(r'[vV]?(\d+(?:\.\d+)*)(.*)$')
+
+@functools.lru_cache(maxsize=4096)
+def parse_version(raw, keep_build=True):
+    text = str(raw).strip() if raw else ""
+    if not keep_build:
+        text = BUILD_NUMBER_PATTERN.sub('', text).strip()
+    base, _, build = text.partition("(")
+    match = VERSION_NUMBER_PATTERN.match(base.strip())
+    if not match:
+        return ParsedVersion(text, None)
+    numbers = [int(part) for part in match.group(1).split(".")]
+    while len(numbers) > 1 and numbers[-1] == 0:
+        numbers.pop()
+    suffix = match.group(2).strip(" .-_+").lower()
+    build_numbers = tuple(int(part) for part in re.findall(r'\d+', build))
+    return ParsedVersion(text, (tuple(numbers), 0 if suffix else 1, suffix, build_numbers))
 
 def clean_version_display(version, should_keep_build_num):
     if not version: return version
-    version = str(version)
-    if not should_keep_build_num:
-        version = re.sub(r'\s*\(.*?\)', '', version)
-    return version.strip()
+    return parse_version(str(version), bool(should_keep_build_num)).text
 
-def validate_update(new_raw, history_data, app_name, platform):
+def recent_versions(history_data):
+    # 兼容旧记录：没有 versions 时由 latest / prev 构造
     if not history_data:
-        return True
+        return []
     if isinstance(history_data, str):
-        latest_ver = history_data
-        prev_ver = None
-    else:
-        latest_ver = history_data.get("latest")
-        prev_ver = history_data.get("prev")
-    should_check = get_check_config(app_name, platform)
-    def clean(v):
-        if not v: return ""
-        s = str(v)
-        if not should_check:
-            s = re.sub(r'\s*\(.*?\)', '', s)
-        return s.strip()
-    v_new = clean(new_raw)
-    v_last = clean(latest_ver)
-    v_prev = clean(prev_ver)
-    if not v_new or "varies" in v_new.lower():
-        return False
-    if v_new == v_last:
-        return False
-    if v_new == v_prev:
-        print(f"🛡️ [防回滚] {app_name}: 检测到上一版本 {v_new}，判定为缓存回滚")
-        return False
-    return True
+        return [history_data]
+    versions = history_data.get("versions")
+    if versions is None:
+        versions = [history_data.get("latest"), history_data.get("prev")]
+    return [version for version in versions if version]
+
+def push_version(versions, version):
+    return ([version] + [item for item in versions if item != version])[:VERSION_HISTORY_SIZE]
 
-def process_check_result(name, key, fetched_ver, platform, history, new_history, current_state, update_buffer):
+def same_version(v_a, v_b):
+    # 两边都能解析时按语义键比较 (v3.2.0 与 3.2.0、1.2 与 1.2.0 视为同一版本)，否则比较文本
+    if v_a.key is not None and v_b.key is not None:
+        return v_a.key == v_b.key
+    return v_a.text == v_b.text
+
+def classify_update(new_raw, history_data, app_name, platform):
+    if not history_data:
+        return "changed"
+    latest_ver = history_data if isinstance(history_data, str) else history_data.get("latest")
+    keep_build = get_app_config(app_name, platform).version_pattern is None
+    v_new = parse_version(str(new_raw), keep_build) if new_raw else ParsedVersion("", None)
+    v_last = parse_version(str(latest_ver), keep_build) if latest_ver else ParsedVersion("", None)
+    if not v_new.text or "varies" in v_new.text.lower():
+        return "unchanged"
+    if same_version(v_new, v_last):
+        return "unchanged"
+    if any(same_version(v_new, parse_version(str(version), keep_build)) for version in recent_versions(history_data)):
+        log(f"🛡️ [防回滚] {app_name}: 检测到近期出现过的版本 {v_new.text}，判定为缓存回滚")
+        return "rollback-suppressed"
+    if PLATFORMS[platform].ordered_versions and v_new.key and v_last.key and v_new.key < v_last.key:
+        log(f"🛡️ [防回滚] {app_name}: 网络版本 {v_new.text} 低于本地版本 {v_last.text}，判定为缓存回滚")
+        return "rollback-suppressed"
+    return "changed"
+
+def confirm_rollback(saved_data, fetched_ver, app_name):
+    candidate = saved_data.get("rollback_candidate") or {}
+    count = candidate.get("count", 0) + 1 if candidate.get("version") == fetched_ver else 1
+    if ROLLBACK_CONFIRM_CHECKS and count >= ROLLBACK_CONFIRM_CHECKS:
+        log(f"↩️ [回退确认] {app_name}: 版本 {fetched_ver} 已连续出现 {count} 次，判定为真实回退", "warn")
+        return "changed"
+    saved_data["rollback_candidate"] = {"version": fetched_ver, "count": count}
+    return "rollback-suppressed"
+
+def process_check_result(name, key, fetched_ver, platform, history, new_history, current_state, update_buffer, extra=None):
     if not fetched_ver:
-        print(f"[{name}] ({platform}) 获取失败")
+        log(f"[{name}] ({platform}) 获取失败", "warn")
+        METRICS.record_outcome(key, name, platform, "failed")
         if key in history: new_history[key] = history[key]
         return
+    now = int(time.time())
     raw_data = history.get(key)
     if isinstance(raw_data, str):
         saved_data = {"latest": raw_data, "prev": None}
     else:
-        saved_data = raw_data if raw_data else {"latest": None, "prev": None}
+        saved_data = dict(raw_data) if raw_data else {"latest": None, "prev": None}
     saved_latest = saved_data.get("latest")
     current_state[name][platform] = fetched_ver or saved_latest
     display_log_ver = fetched_ver
-    if platform == "RSS" and len(display_log_ver) > 30:
-        display_log_ver = display_log_ver[:30] + "..."
-    print(f"[{name}] ({platform}) 网络: {display_log_ver} | 本地: {saved_latest}")
-    if validate_update(fetched_ver, saved_data, name, platform):
+    log_width = PLATFORMS[platform].log_width
+    if log_width and len(display_log_ver) > log_width:
+        display_log_ver = display_log_ver[:log_width] + "..."
+    log(f"[{name}] ({platform}) 网络: {display_log_ver} | 本地: {saved_latest}")
+    outcome = classify_update(fetched_ver, saved_data, name, platform)
+    if outcome == "rollback-suppressed":
+        outcome = confirm_rollback(saved_data, fetched_ver, name)
+    elif outcome == "unchanged":
+        saved_data.pop("rollback_candidate", None)
+    METRICS.record_outcome(key, name, platform, outcome)
+    if outcome == "changed":
         if name not in update_buffer: update_buffer[name] = []
         update_buffer[name].append(platform)
         new_history[key] = {
             "latest": fetched_ver,
-            "prev": saved_latest
+            "prev": saved_latest,
+            "versions": push_version(recent_versions(saved_data), fetched_ver),
+            "last_change": now,
+            "last_check": now
         }
+        if saved_data.get("pushed_at"):
+            new_history[key]["pushed_at"] = saved_data["pushed_at"]
     else:
+        saved_data.setdefault("last_change", now)
+        saved_data["last_check"] = now
         new_history[key] = saved_data
+    if extra:
+        new_history[key].update(extra)
+
+def process_rss_result(name, key, feed_result, platform, history, new_history, current_state, update_buffer):
+    if feed_result is None:
+        process_check_result(name, key, None, platform, history, new_history, current_state, update_buffer)
+        return
+    raw_data = history.get(key)
+    saved_latest = raw_data.get("latest") if isinstance(raw_data, dict) else raw_data
+    fetched_ver = feed_result.titles[0] if feed_result.titles else saved_latest
+    if not fetched_ver:
+        log(f"[{name}] ({platform}) 暂无匹配资源")
+        return
+    if name not in current_state: current_state[name] = {}
+    extra = {"cursor": feed_result.cursor} if feed_result.cursor else None
+    process_check_result(name, key, fetched_ver, platform, history, new_history, current_state, update_buffer, extra=extra)
+    current_state[name][f"{platform}_new_titles"] = feed_result.titles
+
+def build_appstore_lookup_url(app_ids, country, variant=0):
+    # 不同形式的查询地址 (地区路径 / country 参数 + 不同的防缓存参数) 会命中不同的 CDN 缓存键
+    timestamp = int(time.time())
+    ids = ','.join(app_ids)
+    if variant % 2 == 0:
+        url = f"{APPSTORE_API_BASE}/{country}/lookup?id={ids}&t={timestamp}"
+    else:
+        url = f"{APPSTORE_API_BASE}/lookup?id={ids}&country={country}&t={timestamp}"
+    if variant:
+        url += f"&s={variant}"
+    return url
 
-def get_appstore_version(app_id, country="cn"):
+def get_appstore_versions(app_ids, country="cn", variant=0):
     try:
-        timestamp = int(time.time())
-        url = f"https://itunes.apple.com/{country}/lookup?id={app_id}&t={timestamp}"
-        session = get_retry_session()
-        resp = session.get(url, timeout=10).json()
-        if resp["resultCount"] > 0:
-            return resp["results"][0]["version"]
+        url = build_appstore_lookup_url(app_ids, country, variant)
+        session = get_shared_session()
+        resp = session.get(url, timeout=10)
+        resp.raise_for_status()
+        resp = resp.json()
+        versions = {}
+        for result in resp.get("results", []):
+            track_id = str(result.get("trackId", ""))
+            if track_id and result.get("version"):
+                versions[track_id] = result["version"]
+        return versions
     except Exception as e:
-        print(f"❌ [App Store Error] ID {app_id}: {e}")
+        log(f"❌ [App Store Error] {country} 区 ID {','.join(app_ids)}: {e}", "error")
+    return None
+
+GOOGLE_PLAY_DS5_START = b"AF_initDataCallback({key: 'ds:5'"
+GOOGLE_PLAY_DATA_PATTERN = re.compile(rb"data:([\s\S]*), sideChannel: \{\}\}\);$")
+# 版本号在 ds:5 数据中的位置 (与 google_play_scraper 的 ElementSpecs.Detail["version"] 一致)
+GOOGLE_PLAY_VERSION_PATH = [1, 2, 140, 0, 0, 0]
+
+def stream_extract_block(resp, start_marker, end_marker, max_bytes, chunk_size=64 * 1024):
+    # 流式读取响应体，找到 start_marker 与其后第一个 end_marker 之间的内容后立即停止
+    buffer = b""
+    start = -1
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        search_from = max(0, len(buffer) - len(end_marker))
+        buffer += chunk
+        if start < 0:
+            start = buffer.find(start_marker)
+            if start < 0:
+                buffer = buffer[-len(start_marker):]
+                max_bytes -= len(chunk)
+                if max_bytes <= 0:
+                    break
+                continue
+            search_from = start
+        end = buffer.find(end_marker, search_from)
+        if end >= 0:
+            return buffer[start:end]
+        max_bytes -= len(chunk)
+        if max_bytes <= 0:
+            break
     return None
 
+def parse_googleplay_version(block):
+    data_match = GOOGLE_PLAY_DATA_PATTERN.search(block)
+    if not data_match:
+        return None
+    node = json.loads(data_match.group(1))
+    try:
+        for index in GOOGLE_PLAY_VERSION_PATH:
+            node = node[index]
+    except (IndexError, KeyError, TypeError):
+        return "Varies with device"
+    return node
+
+def get_googleplay_version_native(pkg_name, country="us"):
+    url = f"{GOOGLE_PLAY_BASE}/store/apps/details"
+    params = {"id": pkg_name, "hl": "en", "gl": country}
+    resp = get_shared_session().get(url, params=params, timeout=10, stream=True)
+    if resp.status_code == 404:
+        # 部分应用的地区页面返回 404，不带 gl 重试一次；仍为 404 时抛出异常，交由 google_play_scraper 兜底
+        resp.close()
+        resp = get_shared_session().get(url, params={"id": pkg_name, "hl": "en"}, timeout=10, stream=True)
+    with resp:
+        resp.raise_for_status()
+        block = stream_extract_block(resp, GOOGLE_PLAY_DS5_START, b"</script", GOOGLE_PLAY_MAX_BYTES)
+    if block is None:
+        raise ValueError("未找到 ds:5 数据块")
+    return parse_googleplay_version(block)
+
+def scraper_session_get(url):
+    # google_play_scraper 默认使用 urllib 直接请求，录制 / 回放时改为经由共享客户端，以便录入录像文件
+    resp = get_shared_session().get(url, timeout=10)
+    if resp.status_code == 404:
+        raise importlib.import_module("google_play_scraper.exceptions").NotFoundError("App not found(404).")
+    resp.raise_for_status()
+    return resp.text
+
+def get_googleplay_version_scraper(pkg_name, country="us"):
+    scraper = PLATFORMS["Google Play"].module("google_play_scraper")
+    if ACTIVE_CASSETTE is not None:
+        importlib.import_module("google_play_scraper.features.app").get = scraper_session_get
+    result = scraper.app(pkg_name, lang='en', country=country)
+    return result.get('version')
+
 def get_googleplay_version(pkg_name, country="us"):
     try:
-        result = play_app(pkg_name, lang='en', country=country)
-        return result.get('version')
+        return get_googleplay_version_native(pkg_name, country)
+    except Exception as e:
+        if not GOOGLE_PLAY_SCRAPER_FALLBACK:
+            log(f"❌ [Google Play Error] {pkg_name}: {e}", "error")
+            return None
+        log(f"⚠️ [Google Play Warning] {pkg_name}: 原生解析失败 ({e})，改用 google_play_scraper", "warn")
+    try:
+        return get_googleplay_version_scraper(pkg_name, country)
     except Exception as e:
-        print(f"❌ [Google Play Error] {pkg_name}: {e}")
+        log(f"❌ [Google Play Error] {pkg_name}: {e}", "error")
     return None
 
+TAPTAP_VERSION_PATTERN = re.compile(rb'"softwareVersion"\s*:\s*"([^"]+)"')
+
+def stream_search(resp, pattern, max_bytes, chunk_size=16 * 1024, overlap=512):
+    # 分块扫描响应体，保留块尾部 overlap 字节以匹配跨块边界的内容，命中后立即停止读取
+    buffer = b""
+    bytes_read = 0
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        bytes_read += len(chunk)
+        buffer = buffer[-overlap:] + chunk
+        regex_match = pattern.search(buffer)
+        if regex_match:
+            return regex_match, bytes_read
+        if bytes_read >= max_bytes:
+            break
+    return None, bytes_read
+
 def get_taptap_version(app_id):
     try:
-        timestamp = int(time.time())
-        url = f"https://www.taptap.cn/app/{app_id}?_={timestamp}"
-        session = get_retry_session()
-        resp = session.get(url, timeout=10)
-        if resp.status_code != 200:
-            return None
-        regex_match = re.search(r'"softwareVersion"\s*:\s*"([^"]+)"', resp.text)
-        if regex_match:
-            return regex_match.group(1)
-        return None
+        url = f"{TAPTAP_BASE}/app/{app_id}"
+        with conditional_get(url, timeout=10, stream=True) as resp:
+            if resp.status_code == 304:
+                return HTTP_CACHE.cached_value(url)
+            if resp.status_code != 200:
+                return None
+            regex_match, bytes_read = stream_search(resp, TAPTAP_VERSION_PATTERN, TAPTAP_MAX_BYTES)
+            if not regex_match and bytes_read >= TAPTAP_MAX_BYTES:
+                log(f"⚠️ [TapTap Warning] ID {app_id}: 读取 {bytes_read} 字节后仍未找到版本号", "warn")
+            version = regex_match.group(1).decode("utf-8", "replace") if regex_match else None
+            HTTP_CACHE.store(url, resp, version)
+            return version
     except Exception as e:
-        print(f"❌ [TapTap Error] ID {app_id}: {e}")
+        log(f"❌ [TapTap Error] ID {app_id}: {e}", "error")
     return None
 
+# GitHub API 额度跟踪：按 X-RateLimit-Resource (core / graphql) 分别记录剩余额度与重置时间
+class RateLimitTracker:
+    def __init__(self):
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def update(self, resp):
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset_at = resp.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset_at is None:
+            return
+        resource = resp.headers.get("X-RateLimit-Resource", "core")
+        with self.lock:
+            self.limits[resource] = (int(remaining), int(reset_at))
+
+    def should_defer(self, resource, cost=1):
+        with self.lock:
+            limit = self.limits.get(resource)
+        if not limit:
+            return False
+        remaining, reset_at = limit
+        return remaining - cost < GITHUB_MIN_RATE_REMAINING and time.time() < reset_at
+
+GITHUB_RATE_LIMIT = RateLimitTracker()
+
+def github_headers():
+    headers = {"Accept": "application/vnd.github+json"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
 def get_github_version(repo_path):
     try:
-        timestamp = int(time.time())
-        url = f"https://api.github.com/repos/{repo_path}/releases/latest?t={timestamp}"
-        session = get_retry_session()
-        resp = session.get(url, timeout=10)
+        if GITHUB_RATE_LIMIT.should_defer("core", cost=2):
+            log(f"⏸️ [GitHub] API 额度不足，推迟检查: {repo_path}", "warn")
+            return None
+        url = f"{GITHUB_API_BASE}/repos/{repo_path}/releases/latest"
+        resp = conditional_get(url, headers=github_headers(), timeout=10)
+        GITHUB_RATE_LIMIT.update(resp)
+        if resp.status_code == 304:
+            return HTTP_CACHE.cached_value(url)
         if resp.status_code == 404:
-             url = f"https://api.github.com/repos/{repo_path}/tags?t={timestamp}"
-             resp = session.get(url, timeout=10)
+             url = f"{GITHUB_API_BASE}/repos/{repo_path}/tags"
+             resp = conditional_get(url, headers=github_headers(), timeout=10)
+             GITHUB_RATE_LIMIT.update(resp)
+             if resp.status_code == 304:
+                 return HTTP_CACHE.cached_value(url)
              data = resp.json()
-             if data: return data[0]["name"]
+             if data:
+                 HTTP_CACHE.store(url, resp, data[0]["name"])
+                 return data[0]["name"]
         else:
             data = resp.json()
-            if "tag_name" in data: return data["tag_name"]
+            if "tag_name" in data:
+                HTTP_CACHE.store(url, resp, data["tag_name"])
+                return data["tag_name"]
+    except Exception as e:
+        log(f"❌ [GitHub Error] Repo {repo_path}: {e}", "error")
+    return None
+
+GITHUB_REPO_QUERY = (
+    '{alias}: repository(owner: {owner}, name: {name}) {{ '
+    'latestRelease {{ tagName }} '
+    'refs(refPrefix: "refs/tags/", first: 1, orderBy: {{field: TAG_COMMIT_DATE, direction: DESC}}) {{ nodes {{ name }} }} '
+    '}}'
+)
+
+def get_github_versions(repo_paths):
+    # 一次 GraphQL 请求查询多个仓库的最新 Release，无 Release 时取最新 Tag
+    try:
+        if GITHUB_RATE_LIMIT.should_defer("graphql"):
+            log(f"⏸️ [GitHub] GraphQL 额度不足，推迟检查 {len(repo_paths)} 个仓库", "warn")
+            return None
+        parts = []
+        for i, repo_path in enumerate(repo_paths):
+            owner, name = repo_path.split("/", 1)
+            parts.append(GITHUB_REPO_QUERY.format(alias=f"r{i}", owner=json.dumps(owner), name=json.dumps(name)))
+        query = "query { " + " ".join(parts) + " }"
+        resp = get_shared_session().post(f"{GITHUB_API_BASE}/graphql", json={"query": query}, headers=github_headers(), timeout=15)
+        GITHUB_RATE_LIMIT.update(resp)
+        if resp.status_code != 200:
+            log(f"❌ [GitHub Error] GraphQL HTTP {resp.status_code}", "error")
+            return None
+        payload = resp.json()
+        for error in payload.get("errors") or []:
+            log(f"⚠️ [GitHub Warning] {error.get('message')}", "warn")
+        data = payload.get("data") or {}
+        versions = {}
+        for i, repo_path in enumerate(repo_paths):
+            node = data.get(f"r{i}")
+            if not node:
+                continue
+            release = node.get("latestRelease") or {}
+            tags = (node.get("refs") or {}).get("nodes") or []
+            tag_name = release.get("tagName") or (tags[0]["name"] if tags else None)
+            if tag_name:
+                versions[repo_path] = tag_name
+        return versions
     except Exception as e:
-        print(f"❌ [GitHub Error] Repo {repo_path}: {e}")
+        log(f"❌ [GitHub Error] GraphQL {len(repo_paths)} 个仓库: {e}", "error")
     return None
 
-def get_rss_latest(rss_url, regex_pattern=None):
+FeedResult = collections.namedtuple("FeedResult", ["titles", "cursor"])
+
+def read_limited(resp, max_bytes, deadline):
+    # 在总耗时与总字节数限制内读取完整响应体，超限时抛出异常
+    started = time.monotonic()
+    chunks = []
+    bytes_read = 0
+    for chunk in resp.iter_content(chunk_size=64 * 1024):
+        bytes_read += len(chunk)
+        if bytes_read > max_bytes:
+            raise ValueError(f"响应超过 {max_bytes} 字节")
+        if time.monotonic() - started > deadline:
+            raise TimeoutError(f"读取超过 {deadline} 秒")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def iter_feed_entries(content):
+    # 增量解析 RSS 2.0 <item> / Atom <entry>，按文档顺序逐条产出 (guid, title)
+    for _, elem in ET.iterparse(io.BytesIO(content), events=("end",)):
+        if elem.tag.rsplit("}", 1)[-1] not in ("item", "entry"):
+            continue
+        guid = title = link = None
+        for child in elem:
+            child_tag = child.tag.rsplit("}", 1)[-1]
+            if child_tag in ("guid", "id"):
+                guid = (child.text or "").strip()
+            elif child_tag == "title":
+                title = (child.text or "").strip()
+            elif child_tag == "link":
+                link = (child.text or child.get("href") or "").strip()
+        yield guid or link or title, title or ""
+        elem.clear()
+
+def iter_feed_entries_tolerant(content):
+    # 非标准 XML 时退回 feedparser 的容错解析
+    feed = PLATFORMS["RSS"].module("feedparser").parse(content)
+    for entry in feed.entries:
+        title = entry.get("title", "").strip()
+        yield entry.get("id") or entry.get("link") or title, title
+
+def scan_feed_entries(entries, rule, cursor):
+    # 从最新条目开始扫描，遇到上次记录的游标即停止；无游标 (首次运行) 时只取最新一条匹配项
+    titles = []
+    newest_guid = None
+    for guid, title in entries:
+        if newest_guid is None:
+            newest_guid = guid
+        if cursor and guid == cursor:
+            break
+        if rule is None or rule.search(title):
+            titles.append(title)
+            if not cursor or len(titles) >= RSS_MAX_NEW_ENTRIES:
+                break
+    return titles, newest_guid
+
+FeedPayload = collections.namedtuple("FeedPayload", ["status", "content", "resp"])
+
+def fetch_rss_feed(rss_url, conditional=True):
+    try:
+        request = conditional_get if conditional else get_shared_session().get
+        with request(rss_url, timeout=10, stream=True) as resp:
+            if resp.status_code == 304:
+                return FeedPayload(304, None, resp)
+            if resp.status_code != 200:
+                log(f"⚠️ [RSS Warning] HTTP {resp.status_code}: {rss_url}", "warn")
+                return None
+            return FeedPayload(200, read_limited(resp, RSS_MAX_BYTES, RSS_FETCH_DEADLINE), resp)
+    except Exception as e:
+        log(f"❌ [RSS Error] URL {rss_url}: {e}", "error")
+    return None
+
+def get_rss_latest(rss_url, rule=None, cursor=None, feed=None):
     try:
-        feed = feedparser.parse(rss_url)
-        if not feed.entries:
-            print(f"⚠️ [RSS Warning] 解析成功但无条目: {rss_url}")
+        if isinstance(rule, str):
+            rule = re.compile(rule, re.IGNORECASE)
+        if feed is None:
+            feed = fetch_rss_feed(rss_url, conditional=feed_is_conditional(rss_url, cursor))
+        if feed is None:
             return None
-        print(f"🔍 [调试] 正在扫描 {len(feed.entries)} 个条目...")
-        for entry in feed.entries:
-            title = entry.title.strip()
-            print(f"-> 扫描标题: {title}")
-            if not regex_pattern:
-                return title
-            if re.search(regex_pattern, title, re.IGNORECASE):
-                print(f"✅ 匹配成功！")
-                return title
-        print(f"⚠️ [匹配失败] 扫描结束，未找到符合正则的资源")
-        return None
+        if feed.status == 304:
+            return FeedResult([], cursor)
+        try:
+            titles, newest_guid = scan_feed_entries(iter_feed_entries(feed.content), rule, cursor)
+        except ET.ParseError:
+            titles, newest_guid = scan_feed_entries(iter_feed_entries_tolerant(feed.content), rule, cursor)
+        if newest_guid is None:
+            log(f"⚠️ [RSS Warning] 解析成功但无条目: {rss_url}", "warn")
+            return None
+        if titles:
+            log(f"✅ [RSS] 发现 {len(titles)} 个新匹配条目: {rss_url}")
+        if feed.resp is not None:
+            HTTP_CACHE.store(rss_url, feed.resp, newest_guid)
+        return FeedResult(titles, newest_guid)
     except Exception as e:
-        print(f"❌ [RSS Error] URL {rss_url}: {e}")
+        log(f"❌ [RSS Error] URL {rss_url}: {e}", "error")
     return None
 
-def send_bark_notification(title, content, group_name=None, icon_url=None, image_url=None):
-    if not BARK_KEY:
-        print("错误：未检测到 BARK_KEY")
-        return
+def send_bark_notification(title, content, group_name=None, icon_url=None, image_url=None, bark_key=None):
+    bark_key = bark_key or (BARK_KEYS[0] if BARK_KEYS else None)
+    if not bark_key:
+        log("错误：未检测到 BARK_KEY", "error")
+        return False
     if not group_name: group_name = title
     if not icon_url: icon_url = DEFAULT_ICON
-    print(f"🚀 准备推送 -> {title} (归档: {group_name})")
-    url = f"https://api.day.app/{BARK_KEY}"
+    log(f"🚀 准备推送 -> {title} (归档: {group_name})")
+    url = f"{BARK_SERVER}/{bark_key}"
     payload = {
         "title": title,
         "body": content,
@@ -448,155 +1999,732 @@ def send_bark_notification(title, content, group_name=None, icon_url=None, image
         "group": group_name
     }
     if image_url:
-        payload["image"] = image_url        
+        payload["image"] = image_url
+    return post_notification(title, url, data=payload)
+
+def post_notification(title, url, **kwargs):
+    _fetch_context.responses = []
+    started = time.monotonic()
+    ok = False
     try:
-        session = get_retry_session()
-        resp = session.post(url, data=payload, timeout=10)
-        print(f"📨 推送回执: {resp.status_code} - {resp.text}")
+        session = get_shared_session()
+        resp = session.post(url, timeout=10, **kwargs)
+        ok = 200 <= resp.status_code < 300
+        log(f"📨 推送回执: {resp.status_code} - {resp.text}", "info" if ok else "warn")
     except Exception as e:
-        print(f"❌ 推送网络错误: {e}")
+        log(f"❌ 推送网络错误: {e}", "error")
+    finally:
+        METRICS.record_notification(title, time.monotonic() - started, _fetch_context.responses, ok)
+        _fetch_context.responses = None
+    return ok
+
+# 推送限速：同一推送目标相邻两次推送之间至少间隔 1 / rate_per_sec 秒
+class RateLimiter:
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec else 0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.next_slot - now)
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait:
+            time.sleep(wait)
+
+class BarkSink:
+    def __init__(self, bark_key, rate_per_sec=BARK_RATE_PER_SEC):
+        self.name = f"bark:{bark_key[:4]}***"
+        # 发件箱中用于识别推送目标的标识，不直接保存 Bark Key
+        self.sink_id = "bark:" + hashlib.sha1(bark_key.encode("utf-8")).hexdigest()[:16]
+        self.bark_key = bark_key
+        self.limiter = RateLimiter(rate_per_sec)
+
+    def accepts(self, message):
+        return True
+
+    def send(self, message):
+        self.limiter.acquire()
+        return send_bark_notification(message.title, message.body, group_name=message.archive,
+                                      icon_url=message.icon, image_url=message.image, bark_key=self.bark_key)
+
+class WebhookSink:
+    def __init__(self, url, format="json", rate_per_sec=5, groups=None):
+        self.name = f"webhook:{urlparse(url).netloc}"
+        self.sink_id = "webhook:" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        self.url = url
+        self.format = format
+        self.groups = set(groups) if groups else None
+        self.limiter = RateLimiter(rate_per_sec)
+
+    def accepts(self, message):
+        return self.groups is None or message.group in self.groups
+
+    def send(self, message):
+        self.limiter.acquire()
+        log(f"🚀 准备推送 -> {message.title} ({self.name})")
+        if self.format == "text":
+            text = f"{message.title}\n{message.body}"
+            return post_notification(message.title, self.url, data=text.encode("utf-8"),
+                                     headers={"Content-Type": "text/plain; charset=utf-8"})
+        return post_notification(message.title, self.url, json=message._asdict())
+
+def build_notification_sinks():
+    sinks = [BarkSink(bark_key) for bark_key in BARK_KEYS]
+    for conf in WEBHOOK_SINKS:
+        sinks.append(WebhookSink(conf["url"], conf.get("format", "json"), conf.get("rate_per_sec", 5), conf.get("groups")))
+    return sinks
+
+def deliver_jobs(jobs):
+    # 并发发送，结果按 jobs 的顺序返回
+    if not jobs:
+        return []
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(jobs), ENGINE_MAX_CONCURRENCY)) as executor:
+        futures = [executor.submit(sink.send, message) for sink, message in jobs]
+        for (sink, message), future in zip(jobs, futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                log(f"❌ 推送异常 ({sink.name}): {e}", "error")
+                ok = False
+            results.append((sink.name, message, ok))
+    return results
+
+def format_msg_line(app_name, platform, version, app_ver_info=None):
+    conf = get_app_config(app_name, platform)
+    display_ver = clean_version_display(version, conf.build_check)
+    if conf.suffix_visible:
+        return f"{app_name} ({conf.suffix_text}): {display_ver}"
+    else:
+        return f"{app_name}: {display_ver}"
+
+def format_feed_line(app_name, platform, version, app_ver_info=None):
+    # 订阅类平台只显示名称与新条目数，标题不作为版本号展示
+    new_count = len((app_ver_info or {}).get(f"{platform}_new_titles") or [version])
+    if new_count > 1:
+        return f"{app_name} ({new_count} 条新资源)"
+    return app_name
+
+def get_msg_lines(name, update_buffer, current_state):
+    lines = []
+    platforms_updated = update_buffer[name]
+    app_ver_info = current_state.get(name, {})
+    for plat in PLATFORMS:
+        if plat in platforms_updated:
+            lines.append(PLATFORMS[plat].format_line(name, plat, app_ver_info.get(plat), app_ver_info))
+    return list(dict.fromkeys(lines))
+
+GroupMessage = collections.namedtuple("GroupMessage", ["group", "title", "body", "archive", "icon", "image"])
+
+def build_group_message(group_title, app_names, msg_lines):
+    rich_image = None
+    img_urls = [RICH_MEDIA_CONFIG.get(app) for app in app_names]
+    if img_urls and (None not in img_urls) and (len(set(img_urls)) == 1):
+        rich_image = img_urls[0]
+        log(f"🖼️ [富媒体] {group_title}: 判定成功 -> 显示图片", "debug")
+    return GroupMessage(
+        group=group_title,
+        title=group_title,
+        body="\n".join(msg_lines),
+        archive=BARK_ARCHIVE_MAPPING.get(group_title, group_title),
+        icon=NOTIFICATION_ICONS.get(group_title, DEFAULT_ICON),
+        image=rich_image
+    )
+
+def render_group_messages(update_buffer, current_state):
+    messages = []
+    processed_apps = set()
+    for group_title, group_apps in NOTIFICATION_GROUPS.items():
+        group_msg_lines = []
+        updated_apps_in_this_group = []
+        for name in group_apps:
+            if name in update_buffer:
+                processed_apps.add(name)
+                updated_apps_in_this_group.append(name)
+                group_msg_lines.extend(get_msg_lines(name, update_buffer, current_state))
+        if group_msg_lines:
+            messages.append(build_group_message(group_title, updated_apps_in_this_group, group_msg_lines))
+
+    leftover_msg_lines = []
+    leftover_apps_list = []
+    for name in update_buffer:
+        if name not in processed_apps:
+            leftover_apps_list.append(name)
+            leftover_msg_lines.extend(get_msg_lines(name, update_buffer, current_state))
+    if leftover_msg_lines:
+        messages.append(build_group_message(DEFAULT_GROUP, leftover_apps_list, leftover_msg_lines))
+    return messages
+
+# 推送发件箱：enqueue_notifications 在检查阶段写入，drain_outbox 负责投递
+# 同一 (推送目标, 分组) 下的多条待发消息合并为一条推送；失败按指数退避重试，超过 OUTBOX_MAX_ATTEMPTS 次后放弃
+def enqueue_notifications(outbox, messages, sinks=None):
+    # 返回写入的条数；未配置任何推送目标时返回 None，调用方据此不推进历史记录
+    if sinks is None:
+        sinks = build_notification_sinks()
+    if not sinks:
+        log("错误：未配置任何推送目标 (BARK_KEY / WEBHOOK_SINKS)", "error")
+        return None
+    now = int(time.time())
+    entries = [{"sink": sink.sink_id, "group": message.group, "message": message._asdict(), "created_at": now}
+               for message in messages for sink in sinks if sink.accepts(message)]
+    outbox.enqueue(entries)
+    return len(entries)
+
+def coalesce_messages(messages):
+    if len(messages) == 1:
+        return messages[0]
+    latest = messages[-1]
+    lines = list(dict.fromkeys(line for message in messages for line in message.body.split("\n")))
+    images = {message.image for message in messages}
+    return latest._replace(body="\n".join(lines), image=latest.image if len(images) == 1 else None)
+
+def drain_outbox(outbox, sinks=None, now=None, force=False):
+    # force=True 时忽略重试间隔，立即投递全部待发消息
+    if sinks is None:
+        sinks = build_notification_sinks()
+    if not sinks:
+        log("错误：未配置任何推送目标 (BARK_KEY / WEBHOOK_SINKS)，发件箱消息保留到下次投递", "error")
+        return []
+    if now is None: now = time.time()
+    sink_map = {sink.sink_id: sink for sink in sinks}
+    batches = {}
+    orphaned = []
+    for entry in outbox.pending():
+        if entry["sink"] not in sink_map:
+            orphaned.append(entry["id"])
+        else:
+            batches.setdefault((entry["sink"], entry["group"]), []).append(entry)
+    if orphaned:
+        log(f"⚠️ 发件箱中有 {len(orphaned)} 条消息的推送目标已不在配置中，已丢弃", "warn")
+        outbox.complete(orphaned)
+    # 同一 (推送目标, 分组) 中只要有一条消息到期，就连同仍在等待重试的消息一起合并发送，保持消息顺序
+    batches = {batch_key: entries for batch_key, entries in batches.items()
+               if force or any(entry["next_attempt"] <= now for entry in entries)}
+    if not batches:
+        return []
+
+    jobs = [(sink_map[sink_id], coalesce_messages([GroupMessage(**entry["message"]) for entry in entries]))
+            for (sink_id, group), entries in batches.items()]
+    log(f"📤 发件箱投递：{sum(len(entries) for entries in batches.values())} 条待发消息，合并为 {len(jobs)} 次推送")
+
+    delivered, deferred, dropped = [], [], []
+    results = deliver_jobs(jobs)
+    for entries, (sink_name, message, ok) in zip(batches.values(), results):
+        for entry in entries:
+            if ok:
+                delivered.append(entry["id"])
+                continue
+            entry["attempts"] += 1
+            if entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                dropped.append(entry["id"])
+            else:
+                entry["next_attempt"] = int(now + min(OUTBOX_RETRY_DELAY * 2 ** (entry["attempts"] - 1), OUTBOX_MAX_RETRY_DELAY))
+                deferred.append(entry)
+    if dropped:
+        log(f"❌ 发件箱中有 {len(dropped)} 条消息已重试 {OUTBOX_MAX_ATTEMPTS} 次仍失败，已放弃", "error")
+    outbox.complete(delivered + dropped)
+    outbox.defer(deferred)
+    if deferred:
+        log(f"⏳ {len(deferred)} 条消息推送失败，已保留在发件箱中等待重试", "warn")
+    return results
 
 # ==========================================
-#             第三部分：主程序运行区
+#             平台注册表
 # ==========================================
+# 每个平台声明：监控列表、历史记录键格式、默认选项、任务构建方式、结果处理函数与按需导入的依赖模块
+# 依赖模块仅在该平台本轮有到期目标时才导入；新增平台只需在此注册，无需修改主流程
 
-if __name__ == "__main__":
-    HISTORY_FILE = "version_history.json"
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r") as f:
+class Platform:
+    def __init__(self, name, list_name, key_format, build_tasks, base_url_name=None,
+                 defaults=None, process_result=process_check_result, ordered_versions=True,
+                 rule_table=None, log_width=None, format_line=format_msg_line):
+        self.name = name
+        self.list_name = list_name
+        self.key_format = key_format
+        self.build_tasks = build_tasks
+        self.base_url_name = base_url_name
+        self.defaults = defaults or {}
+        self.process_result = process_result
+        # 版本号可按语义排序的平台会拒绝低于本地记录的版本；RSS 标题不是版本号，只做相等比较
+        self.ordered_versions = ordered_versions
+        # 按应用名配置正则过滤规则的全局字典名 (如 RSS_REGEX_RULES)
+        self.rule_table = rule_table
+        # 日志中显示的版本文本最大长度，None 表示不截断
+        self.log_width = log_width
+        # 推送消息中每个应用一行的格式化函数
+        self.format_line = format_line
+        self.loaded_modules = {}
+        self.lock = threading.Lock()
+
+    def items(self):
+        return globals()[self.list_name]
+
+    def make_key(self, item):
+        fields = {"name": item[0], "id": item[1]}
+        fields["country"] = item[2] if len(item) > 2 else self.defaults.get("country")
+        return self.key_format.format(**fields)
+
+    def host(self, item=None):
+        if self.base_url_name is None:
+            return urlparse(item[1]).netloc if item else None
+        return urlparse(globals()[self.base_url_name]).netloc
+
+    def module(self, module_name):
+        with self.lock:
+            if module_name not in self.loaded_modules:
+                self.loaded_modules[module_name] = importlib.import_module(module_name)
+            return self.loaded_modules[module_name]
+
+PLATFORMS = {}
+
+def register_platform(platform):
+    PLATFORMS[platform.name] = platform
+    return platform
+
+def build_single_tasks(platform, items, worker_func):
+    return [CheckTask(platform.name, platform.host(item), worker_func, item, [item]) for item in items]
+
+def build_appstore_tasks(platform, items, history):
+    return [CheckTask(platform.name, platform.host(), worker_appstore_batch, batch, batch[1]) for batch in group_appstore_list(items)]
+
+def build_googleplay_tasks(platform, items, history):
+    return build_single_tasks(platform, items, worker_googleplay)
+
+def build_taptap_tasks(platform, items, history):
+    return build_single_tasks(platform, items, worker_taptap)
+
+def build_github_tasks(platform, items, history):
+    if not GITHUB_TOKEN:
+        return build_single_tasks(platform, items, worker_github)
+    return [CheckTask(platform.name, platform.host(), worker_github_batch, chunk, chunk)
+            for chunk in chunk_by_id(items, GITHUB_GRAPHQL_BATCH_SIZE, lambda item: item[1].lower())]
+
+def build_rss_tasks(platform, items, history):
+    tasks = []
+    for item in items:
+        record = history.get(platform.make_key(item))
+        cursor = record.get("cursor") if isinstance(record, dict) else None
+        tasks.append(CheckTask(platform.name, platform.host(item), worker_rss, (item, cursor), [item]))
+    return tasks
+
+register_platform(Platform("App Store", "APP_STORE_LIST", "app_{id}_{country}", build_appstore_tasks,
+                           base_url_name="APPSTORE_API_BASE", defaults={"country": "cn"}))
+register_platform(Platform("Google Play", "GOOGLE_PLAY_LIST", "gp_{id}_{country}", build_googleplay_tasks,
+                           base_url_name="GOOGLE_PLAY_BASE", defaults={"country": "us"}))
+register_platform(Platform("TapTap", "TAPTAP_LIST", "taptap_{id}", build_taptap_tasks, base_url_name="TAPTAP_BASE"))
+register_platform(Platform("GitHub", "GITHUB_REPO_LIST", "gh_{id}", build_github_tasks, base_url_name="GITHUB_API_BASE"))
+register_platform(Platform("RSS", "RSS_LIST", "rss_{name}", build_rss_tasks,
+                           process_result=process_rss_result, ordered_versions=False,
+                           rule_table="RSS_REGEX_RULES", log_width=30, format_line=format_feed_line))
+
+# ==========================================
+#             推送接收
+# ==========================================
+# 随常驻模式运行的本地 HTTP 接收器：GitHub release webhook 与 WebSub 内容推送到达后，
+# 直接交给对应平台的结果处理函数，并走与轮询相同的历史记录写入与分组推送流程
+# 收到过推送的目标会在历史记录中标记 pushed_at，之后只按 RECEIVER_SAFETY_INTERVAL 兜底轮询
+RECEIVER_ACTIVE = False
+
+class DaemonState:
+    # 常驻模式的共享状态：轮询线程与接收器线程通过 lock 串行修改历史记录
+    def __init__(self, store, history):
+        self.store = store
+        self.history = history
+        self.lock = threading.Lock()
+
+def verify_hub_signature(secret, body, signature):
+    if not secret or not signature or "=" not in signature:
+        return False
+    algorithm, digest = signature.split("=", 1)
+    if algorithm not in ("sha1", "sha256"):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, algorithm).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+def find_push_targets(platform, target_id):
+    target_id = (target_id or "").lower()
+    return [item for item in PLATFORMS[platform].items() if item[1].lower() == target_id]
+
+def ingest_push_results(state, results):
+    # results: [(平台, 监控条目, 抓取结果)]；RSS 推送内容为 FeedPayload，按该条目的过滤规则与游标解析
+    with state.lock:
+        history = state.history
+        new_history = history.copy()
+        current_state = {}
+        update_buffer = {}
+        now = int(time.time())
+        for platform, item, fetched in results:
+            name = item[0]
+            current_state.setdefault(name, {})
+            key = make_history_key(platform, item)
+            if isinstance(fetched, FeedPayload):
+                record = history.get(key)
+                cursor = record.get("cursor") if isinstance(record, dict) else None
+                fetched = get_rss_latest(item[1], get_app_config(name, "RSS").entry_rule, cursor, feed=fetched)
+            PLATFORMS[platform].process_result(name, key, fetched, platform, history, new_history, current_state, update_buffer)
+            if key in new_history:
+                new_history[key] = dict(new_history[key], pushed_at=now)
+        if commit_results(state.store, diff_history(history, new_history), update_buffer, current_state):
+            POLL_SCHEDULE.update(schedule_changes(history, new_history))
+            POLL_SCHEDULE.save()
+            state.history = new_history
+
+def parse_github_event(headers, body):
+    event = headers.get("X-GitHub-Event")
+    if event == "ping":
+        return 200, "pong", []
+    if event != "release":
+        return 202, f"ignored event {event}", []
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("payload 不是 JSON 对象")
+    release = payload.get("release") or {}
+    # 与 releases/latest 保持一致：忽略草稿与预发布版本
+    if payload.get("action") not in ("published", "released") or release.get("draft") or release.get("prerelease"):
+        return 202, "ignored release", []
+    repo = (payload.get("repository") or {}).get("full_name")
+    items = find_push_targets("GitHub", repo)
+    if not items or not release.get("tag_name"):
+        return 202, f"ignored repository {repo}", []
+    return 202, "accepted", [("GitHub", item, release["tag_name"]) for item in items]
+
+def parse_websub_notification(headers, body, query):
+    links = requests.utils.parse_header_links(headers.get("Link", "")) if headers.get("Link") else []
+    topic = next((link["url"] for link in links if link.get("rel") == "self"), None) or query.get("topic")
+    items = find_push_targets("RSS", topic)
+    if not items:
+        return 202, f"ignored topic {topic}", []
+    feed = FeedPayload(200, body, None)
+    return 202, "accepted", [("RSS", item, feed) for item in items]
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    server_version = "VersionMonitor"
+
+    def log_message(self, format, *args):
+        log(f"📥 [接收器] {self.address_string()} {format % args}", "debug")
+
+    def reply(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def do_GET(self):
+        # WebSub 订阅验证：主题属于 RSS_LIST 时原样返回 hub.challenge
+        parsed = urlparse(self.path)
+        query = dict(parse_qsl(parsed.query))
+        topic = query.get("hub.topic")
+        if parsed.path != RECEIVER_WEBSUB_PATH or not RECEIVER_WEBSUB_SECRET or not topic:
+            self.reply(404, "not found")
+        elif query.get("hub.mode") == "denied":
+            log(f"⚠️ [接收器] WebSub 订阅被拒绝: {topic} ({query.get('hub.reason', '')})", "warn")
+            self.reply(200, "")
+        elif query.get("hub.mode") in ("subscribe", "unsubscribe") and find_push_targets("RSS", topic) and "hub.challenge" in query:
+            log(f"✅ [接收器] WebSub {query['hub.mode']} 验证通过: {topic}")
+            self.reply(200, query["hub.challenge"])
+        else:
+            self.reply(404, "unknown topic")
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.reply(400, "invalid Content-Length")
+            return
+        if length > RECEIVER_MAX_BODY:
+            self.reply(413, "payload too large")
+            return
+        body = self.rfile.read(length)
+        if parsed.path == RECEIVER_GITHUB_PATH and RECEIVER_GITHUB_SECRET:
+            if not verify_hub_signature(RECEIVER_GITHUB_SECRET, body, self.headers.get("X-Hub-Signature-256")):
+                self.reply(401, "invalid signature")
+                return
+            parse = lambda: parse_github_event(self.headers, body)
+        elif parsed.path == RECEIVER_WEBSUB_PATH and RECEIVER_WEBSUB_SECRET:
+            if not verify_hub_signature(RECEIVER_WEBSUB_SECRET, body, self.headers.get("X-Hub-Signature")):
+                # WebSub 规范要求签名无效时仍返回 2xx，但忽略内容
+                self.reply(202, "ignored")
+                return
+            parse = lambda: parse_websub_notification(self.headers, body, dict(parse_qsl(parsed.query)))
+        else:
+            self.reply(404, "not found")
+            return
+        try:
+            status, text, results = parse()
+        except ValueError as e:
+            self.reply(400, f"invalid payload: {e}")
+            return
+        # 先应答再处理，避免推送方因处理耗时 (等待轮询结束、发送推送) 而超时重发
+        self.reply(status, text)
+        if results:
+            log(f"📥 [接收器] 收到 {len(results)} 个目标的推送: {', '.join(item[0] for _, item, _ in results)}", "warn")
             try:
-                history = json.load(f)
-            except json.JSONDecodeError:
-                print("⚠️ 警告：历史记录文件损坏或为空文件，已重置。")
-                history = {}
+                ingest_push_results(self.server.state, results)
+            except Exception as e:
+                log(f"❌ [接收器] 处理推送失败: {e}", "error")
+
+def parse_listen_address(value):
+    host, _, port = value.rpartition(":")
+    if not port.isdigit():
+        raise argparse.ArgumentTypeError(f"监听地址格式应为 主机:端口: {value}")
+    return host or "127.0.0.1", int(port)
+
+def start_receiver(address, state):
+    # 未签名的推送会直接写入历史记录并降低轮询频率，因此每个入口都必须配置密钥
+    global RECEIVER_ACTIVE
+    if not RECEIVER_GITHUB_SECRET and not RECEIVER_WEBSUB_SECRET:
+        raise ValueError("推送接收器需要配置 RECEIVER_GITHUB_SECRET 或 RECEIVER_WEBSUB_SECRET")
+    for platform, secret_name, secret in (("GitHub", "RECEIVER_GITHUB_SECRET", RECEIVER_GITHUB_SECRET),
+                                          ("RSS", "RECEIVER_WEBSUB_SECRET", RECEIVER_WEBSUB_SECRET)):
+        if PLATFORMS[platform].items() and not secret:
+            log(f"⚠️ 未配置 {secret_name}，{platform} 推送入口未启用", "warn")
+    server = ThreadingHTTPServer(address, ReceiverHandler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="receiver", daemon=True).start()
+    RECEIVER_ACTIVE = True
+    endpoints = [f"GitHub: {RECEIVER_GITHUB_PATH}"] if RECEIVER_GITHUB_SECRET else []
+    endpoints += [f"WebSub: {RECEIVER_WEBSUB_PATH}"] if RECEIVER_WEBSUB_SECRET else []
+    log(f"📡 推送接收器已启动: http://{address[0]}:{server.server_address[1]} ({'，'.join(endpoints)})", "warn")
+    return server
+
+# ==========================================
+#             第三部分：主程序运行区
+# ==========================================
+
+def commit_results(store, changed_records, update_buffer, current_state):
+    # 先写入发件箱再写历史记录：中途崩溃时最多重复推送，而不会丢失推送
+    # 返回 False 表示本轮结果未写入 (没有推送目标可接收更新)，调用方不应推进轮询进度，下次运行重新检测
+    if update_buffer:
+        count = enqueue_notifications(store.outbox(), render_group_messages(update_buffer, current_state))
+        if count is None:
+            log(f"\n>>> 检测到 {len(update_buffer)} 个应用有更新，但没有推送目标可接收，本轮结果不写入历史记录", "error")
+            return False
+        log(f"\n>>> 检测到更新，已写入发件箱 {count} 条消息")
     else:
-        history = {}
+        log("\n>>> 未检测到更新。")
 
-    update_buffer = {}
-    current_state = {}
-    new_history = history.copy()
+    if changed_records:
+        store.upsert_many(changed_records)
+        log(f"💾 已写入 {len(changed_records)} 条历史记录")
 
-    print("\n>>> 开始检查 App Store (并行)...")
-    results = fetch_parallel(APP_STORE_LIST, worker_appstore, max_workers=5)
-    for item, fetched_ver in results:
-        name, app_id = item[0], item[1]
-        country = item[2] if len(item) > 2 else "cn"
-        key = f"app_{app_id}_{country}"
-        if name not in current_state: current_state[name] = {}
-        process_check_result(name, key, fetched_ver, "App Store", history, new_history, current_state, update_buffer)
-
-    print("\n>>> 开始检查 Google Play (并行)...")
-    results = fetch_parallel(GOOGLE_PLAY_LIST, worker_googleplay, max_workers=5)
-    for item, fetched_ver in results:
-        name, pkg_name = item[0], item[1]
-        country = item[2] if len(item) > 2 else "us"
-        key = f"gp_{pkg_name}_{country}"
-        if name not in current_state: current_state[name] = {}
-        process_check_result(name, key, fetched_ver, "Google Play", history, new_history, current_state, update_buffer)
+    if OUTBOX_DRAIN_INLINE:
+        drain_outbox(store.outbox())
+    return True
 
-    print("\n>>> 开始检查 TapTap (并行)...")
-    results = fetch_parallel(TAPTAP_LIST, worker_taptap, max_workers=5)
-    for item, fetched_ver in results:
-        name, app_id = item[0], item[1]
-        key = f"taptap_{app_id}"
-        if name not in current_state: current_state[name] = {}
-        process_check_result(name, key, fetched_ver, "TapTap", history, new_history, current_state, update_buffer)
+def run_once(store, history):
+    # 执行一轮检查：只检查到期目标，增量写入历史记录，推送更新，返回新的内存状态
+    METRICS.reset()
+    tasks = build_check_tasks(history)
+    if not tasks:
+        log("💤 本轮没有到期的检查目标", "debug")
+        if OUTBOX_DRAIN_INLINE:
+            drain_outbox(store.outbox())
+        return history
+    new_history, current_state, update_buffer = run_checks(history, tasks)
+    committed = commit_results(store, diff_history(history, new_history), update_buffer, current_state)
+    if committed:
+        POLL_SCHEDULE.update(schedule_changes(history, new_history))
+        POLL_SCHEDULE.save()
+    HTTP_CACHE.save()
+    write_run_report()
+    return new_history if committed else history
 
-    print("\n>>> 开始检查 GitHub (并行)...")
-    results = fetch_parallel(GITHUB_REPO_LIST, worker_github, max_workers=5)
-    for item, fetched_ver in results:
-        name, repo = item[0], item[1]
-        key = f"gh_{repo}"
-        if name not in current_state: current_state[name] = {}
-        process_check_result(name, key, fetched_ver, "GitHub", history, new_history, current_state, update_buffer)
+# 分片运行：每个分片只检查属于自己的目标，不写历史记录、不推送，而是把结果增量写入文件
+# 所有分片结束后由合并步骤统一写入历史记录并发送一次汇总推送
+def shard_delta_path(shard):
+    return os.path.join(SHARD_DELTA_DIR, f"shard_{shard[0]}_of_{shard[1]}.json")
 
-    print("\n>>> 开始检查 RSS 订阅 (并行)...")
-    results = fetch_parallel(RSS_LIST, worker_rss, max_workers=5)
-    for item, fetched_ver in results:
-        name, rss_url = item[0], item[1]
-        key = f"rss_{name}"
-        if name not in current_state: current_state[name] = {}
-        process_check_result(name, key, fetched_ver, "RSS", history, new_history, current_state, update_buffer)
+def run_shard(store, shard, delta_path=None):
+    METRICS.reset()
+    history = load_history(store)
+    tasks = build_check_tasks(history, shard=shard)
+    if tasks:
+        new_history, current_state, update_buffer = run_checks(history, tasks)
+    else:
+        new_history, current_state, update_buffer = history, {}, {}
+    records = diff_history(history, new_history)
+    delta = {
+        "shard": list(shard),
+        "created_at": int(time.time()),
+        "records": records,
+        # 分片读取时的原记录：合并时历史记录已与之不同 (被更新的运行写过) 的变更视为过期，不再写入
+        "base": {key: persisted_record(history.get(key)) for key in records},
+        "schedule": schedule_changes(history, new_history),
+        "update_buffer": update_buffer,
+        "current_state": current_state,
+        "http_cache": HTTP_CACHE.changes
+    }
+    path = delta_path or shard_delta_path(shard)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_json_atomic(path, delta)
+    log(f"🧩 分片 {shard[0]}/{shard[1]}: 检查 {sum(len(task.items) for task in tasks)} 个目标，"
+        f"{len(delta['records'])} 条记录变更，{len(update_buffer)} 个应用有更新，已写入 {path}", "warn")
+    write_run_report()
 
-    if update_buffer:
-        print("\n>>> 检测到更新，准备推送...")
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(new_history, f, indent=2)
-        
-        def format_msg_line(app_name, platform, version):
-            if platform == "RSS":
-                return app_name
-            
-            should_check = get_check_config(app_name, platform)
-            display_ver = clean_version_display(version, should_check)
-            final_conf = None
-            if app_name in SUFFIX_CONFIG_APPS:
-                if platform in SUFFIX_CONFIG_APPS[app_name]:
-                    final_conf = SUFFIX_CONFIG_APPS[app_name][platform]
-            if final_conf is None:
-                found_group = None
-                for g_name, g_apps in NOTIFICATION_GROUPS.items():
-                    if app_name in g_apps:
-                        found_group = g_name
-                        break
-                if found_group and found_group in SUFFIX_CONFIG_GROUPS:
-                    if platform in SUFFIX_CONFIG_GROUPS[found_group]:
-                        final_conf = SUFFIX_CONFIG_GROUPS[found_group][platform]
-            if final_conf is None:
-                final_conf = SUFFIX_CONFIG_GLOBAL.get(platform, [platform, True])
-            suffix_text = final_conf[0]
-            is_visible = final_conf[1]
-            if is_visible:
-                return f"{app_name} ({suffix_text}): {display_ver}"
+def load_shard_deltas(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json"))
+        else:
+            files.append(path)
+    deltas = []
+    for path in files:
+        with open(path, "r") as f:
+            try:
+                delta = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"分片结果文件 {path} 已损坏: {e}")
+        delta["path"] = path
+        deltas.append(delta)
+    # 新的增量优先：同一目标出现在多个增量中时，较旧的增量会因原记录已变化而被跳过
+    deltas.sort(key=lambda delta: delta.get("created_at", 0), reverse=True)
+    return deltas
+
+def merge_shard_deltas(store, paths):
+    deltas = load_shard_deltas(paths)
+    shard_counts = {delta["shard"][1] for delta in deltas}
+    missing = [] if len(shard_counts) != 1 else sorted(set(range(max(shard_counts))) - {delta["shard"][0] for delta in deltas})
+    if len(shard_counts) != 1 or missing:
+        log(f"⚠️ 分片结果不完整或分片数不一致 (分片数 {sorted(shard_counts)}，缺少 {missing})，缺失分片的目标将在下次运行时检查", "warn")
+
+    targets = {platform.make_key(item): (item[0], platform.name) for platform in PLATFORMS.values() for item in platform.items()}
+    stored = {key: persisted_record(record) for key, record in store.load_all().items()}
+    records, update_buffer, current_state = {}, {}, {}
+    stale = 0
+    for delta in deltas:
+        base = delta.get("base", {})
+        accepted = set()
+        for key, record in delta["records"].items():
+            if stored.get(key) != base.get(key):
+                stale += 1
+                continue
+            records[key] = stored[key] = record
+            if key in targets:
+                accepted.add(targets[key])
+        for name, platforms in delta["update_buffer"].items():
+            merged = update_buffer.setdefault(name, [])
+            merged.extend(platform for platform in platforms if (name, platform) in accepted and platform not in merged)
+        # 只合并已采纳记录的显示状态；较新的增量先处理，已有的值不被旧增量覆盖
+        for name, platform in accepted:
+            state = delta["current_state"].get(name, {})
+            merged_state = current_state.setdefault(name, {})
+            for field in (platform, f"{platform}_new_titles"):
+                if field in state:
+                    merged_state.setdefault(field, state[field])
+        POLL_SCHEDULE.update(delta.get("schedule", {}))
+    # 请求缓存按从旧到新的顺序应用，较新的校验值最终生效
+    for delta in reversed(deltas):
+        HTTP_CACHE.apply(delta.get("http_cache", {}))
+    update_buffer = {name: platforms for name, platforms in update_buffer.items() if platforms}
+    if stale:
+        log(f"⚠️ {stale} 条分片记录在分片运行后已被更新，判定为过期并跳过", "warn")
+    log(f"🧩 已合并 {len(deltas)} 个分片结果", "warn")
+    if not commit_results(store, records, update_buffer, current_state):
+        # 增量文件保留原名，配置推送目标后重新合并即可
+        HTTP_CACHE.save()
+        return
+    POLL_SCHEDULE.save()
+    HTTP_CACHE.save()
+    # 已写入的增量改名保留，避免下次合并重复写入旧结果
+    for delta in deltas:
+        os.replace(delta["path"], delta["path"] + ".merged")
+
+def run_daemon(tick=DAEMON_TICK_SECONDS, listen=None):
+    # 常驻模式：配置、连接池与历史记录常驻内存，按内部周期只检查到期目标，收到 SIGTERM / SIGINT 后完成当前一轮再退出
+    global RECEIVER_ACTIVE
+    stop_event = threading.Event()
+    def handle_signal(signum, frame):
+        log(f"🛑 收到信号 {signum}，完成当前检查后退出", "warn")
+        stop_event.set()
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    store = open_history_store()
+    state = DaemonState(store, load_history(store))
+    log(f"🔁 常驻模式已启动，调度周期 {tick} 秒，已加载 {len(state.history)} 条历史记录", "warn")
+    receiver = None
+    try:
+        if listen:
+            receiver = start_receiver(listen, state)
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                with state.lock:
+                    state.history = run_once(store, state.history)
+            except Exception as e:
+                log(f"❌ 本轮检查异常: {e}", "error")
+            stop_event.wait(max(0.0, tick - (time.monotonic() - started)))
+    finally:
+        if receiver is not None:
+            receiver.shutdown()
+            receiver.server_close()
+            RECEIVER_ACTIVE = False
+        with state.lock:
+            POLL_SCHEDULE.save()
+            HTTP_CACHE.save()
+            store.close()
+        log("👋 常驻模式已退出", "warn")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多平台应用版本监控")
+    parser.add_argument("--daemon", action="store_true", help="常驻运行，按内部调度周期持续检查")
+    parser.add_argument("--tick", type=float, default=DAEMON_TICK_SECONDS, help="常驻模式的调度周期 (秒)")
+    parser.add_argument("--listen", type=parse_listen_address, metavar="HOST:PORT", help="以常驻模式运行并启动推送接收器 (GitHub webhook / WebSub)")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="分片运行：只检查第 i 个分片 (0 <= i < N) 的目标，结果写入增量文件，不写历史记录也不推送")
+    parser.add_argument("--delta", metavar="PATH", help="分片增量文件路径 (默认写入 SHARD_DELTA_DIR)")
+    parser.add_argument("--merge", nargs="+", metavar="PATH", help="合并分片增量文件 (或所在目录)，写入历史记录并发送汇总推送；已合并的文件改名为 *.merged")
+    parser.add_argument("--drain-only", action="store_true", help="只投递发件箱中的待发消息，不执行检查")
+    parser.add_argument("--record", metavar="PATH", help="录制本次运行的所有上游响应到录像文件 (gzip 压缩的 JSON)；与回放相同，推送不会真正发送，不使用条件请求，也不写入历史记录与请求缓存")
+    parser.add_argument("--replay", metavar="PATH", help="从录像文件回放上游响应，不访问网络，也不读写请求缓存与轮询进度、不写入历史记录")
+    parser.add_argument("--replay-timing", choices=["fast", "recorded"], default="fast", help="回放速度：fast 立即返回，recorded 按录制时的耗时返回")
+    args = parser.parse_args(argv)
+    if sum(bool(mode) for mode in (args.daemon or args.listen, args.shard, args.merge, args.drain_only)) > 1:
+        parser.error("--daemon、--shard、--merge 与 --drain-only 不能同时使用")
+    if args.listen and not (RECEIVER_GITHUB_SECRET or RECEIVER_WEBSUB_SECRET):
+        parser.error("--listen 需要配置 RECEIVER_GITHUB_SECRET 或 RECEIVER_WEBSUB_SECRET")
+    if args.record and args.replay:
+        parser.error("--record 与 --replay 不能同时使用")
+
+    compile_app_config()
+    cassette = None
+    if args.record:
+        cassette = install_cassette(args.record, "record")
+    elif args.replay:
+        cassette = install_cassette(args.replay, "replay", args.replay_timing)
+    # 录制 / 回放时从空的请求缓存与轮询进度开始 (不读取也不写回)：不发送条件请求头，录像中都是完整响应，
+    # 所有目标都到期检查，回放结果不依赖本机的缓存文件
+    if cassette is None:
+        HTTP_CACHE.load(HTTP_CACHE_FILE)
+        POLL_SCHEDULE.load(SCHEDULE_FILE)
+    try:
+        if args.daemon or args.listen:
+            run_daemon(args.tick, args.listen)
+            return
+        store = open_history_store()
+        try:
+            if args.shard:
+                run_shard(store, args.shard, args.delta)
+            elif args.merge:
+                merge_shard_deltas(store, args.merge)
+            elif args.drain_only:
+                drain_outbox(store.outbox(), force=True)
             else:
-                return f"{app_name}: {display_ver}"
-
-        def get_msg_lines(name):
-            lines = []
-            platforms_updated = update_buffer[name]
-            app_ver_info = current_state.get(name, {})
-            for plat in ["App Store", "Google Play", "TapTap", "GitHub", "RSS"]:
-                if plat in platforms_updated:
-                    plat_ver = app_ver_info.get(plat)
-                    lines.append(format_msg_line(name, plat, plat_ver))
-            return list(dict.fromkeys(lines))
-
-        processed_apps = set()
-        for group_title, group_apps in NOTIFICATION_GROUPS.items():
-            group_msg_lines = []
-            updated_apps_in_this_group = []
-            for name in group_apps:
-                if name in update_buffer:
-                    processed_apps.add(name)
-                    updated_apps_in_this_group.append(name)
-                    group_msg_lines.extend(get_msg_lines(name))
-            if group_msg_lines:
-                archive_name = BARK_ARCHIVE_MAPPING.get(group_title, group_title)
-                group_icon = NOTIFICATION_ICONS.get(group_title, DEFAULT_ICON)
-                rich_image = None
-                config_source = globals().get("RICH_MEDIA_CONFIG", {})
-                img_urls = [config_source.get(app) for app in updated_apps_in_this_group]
-                if img_urls and (None not in img_urls) and (len(set(img_urls)) == 1):
-                    rich_image = img_urls[0]
-                    print(f"🖼️ [富媒体] {group_title}: 判定成功 -> 显示图片")
-                send_bark_notification(group_title, "\n".join(group_msg_lines), group_name=archive_name, icon_url=group_icon, image_url=rich_image)
-                time.sleep(1)
-
-        leftover_msg_lines = []
-        leftover_apps_list = []
-        for name in update_buffer:
-            if name not in processed_apps:
-                leftover_apps_list.append(name)
-                leftover_msg_lines.extend(get_msg_lines(name))
-        if leftover_msg_lines:
-            archive_name = BARK_ARCHIVE_MAPPING.get(DEFAULT_GROUP, DEFAULT_GROUP)
-            other_icon = NOTIFICATION_ICONS.get(DEFAULT_GROUP, DEFAULT_ICON)
-            rich_image = None
-            config_source = globals().get("RICH_MEDIA_CONFIG", {})
-            img_urls = [config_source.get(app) for app in leftover_apps_list]
-            if img_urls and (None not in img_urls) and (len(set(img_urls)) == 1):
-                rich_image = img_urls[0]
-                print(f"🖼️ [富媒体] {DEFAULT_GROUP}: 判定成功 -> 显示图片")
-            send_bark_notification(DEFAULT_GROUP, "\n".join(leftover_msg_lines), group_name=archive_name, icon_url=other_icon, image_url=rich_image)
-    else:
-        print("\n>>> 未检测到更新。")
+                run_once(store, load_history(store))
+        finally:
+            store.close()
+    finally:
+        if cassette is not None:
+            cassette.save()
+
+if __name__ == "__main__":
+    main()